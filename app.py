@@ -1,16 +1,18 @@
 import streamlit as st
 import time
 import random
-from google import genai
+import itertools
 from google.genai import types
-import PyPDF2
+import hashlib
 import json
 import csv
 import html
 from io import StringIO
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timedelta
 import os
 import re
+import uuid
 from dotenv import load_dotenv
 
 # Load environment variables IMMEDIATELY
@@ -18,18 +20,29 @@ load_dotenv()
 from PIL import Image
 from io import BytesIO
 from streamlit_js_eval import streamlit_js_eval
+from generation_cache import get_generation_cache, make_cache_key
+from card_parser import iter_cards, parse_cards
+import metrics
+import gemini_client
+import pdf_extract
+from rate_limiter import call_gemini, get_limiter, RateLimitTimeout
+from dedup_index import get_user_index
+from generation_jobs import get_job_runner, ACTIVE_STATUSES, FINISHED_STATUSES
+from review_buffer import get_review_buffer
+from due_queue import DueQueue, review_timestamp
+from card_store import CardStore
 
 # Supabase integration
 try:
     from supabase_client import (
         sign_in_email, sign_up_email,
         get_google_oauth_url, set_session_from_tokens, sign_out,
-        save_flashcard_set, load_user_flashcards, update_card_progress,
+        save_flashcard_set, load_user_flashcards_lazy, get_flashcard_changes,
         get_cards_for_review, delete_flashcard_set,
         export_user_data, delete_user_account,
         get_user_premium_status, set_user_premium_status, get_user_profile,
         make_set_public, get_public_sets, clone_public_set, get_user_sets,
-        update_streak, get_streak,
+        update_streak, get_streak, review_writer,
         get_daily_usage, increment_daily_usage,
         SUPABASE_URL
     )
@@ -63,8 +76,17 @@ except ImportError:
 # CONSTANTS
 # ===========================
 GEMINI_MODEL = "gemini-2.0-flash"
+PROMPT_VERSION = 1  # Bump when build_flashcards_prompt changes (invalidates generation cache)
+
+# Long inputs are split into chunks and generated in parallel (map-reduce)
+CHARS_PER_TOKEN = 4
+CHUNK_MAX_TOKENS = 6000      # ~24k chars: comfortably inside the 30 s request timeout
+CHUNK_WORKERS = 4
+IMAGE_WORKERS = int(os.getenv("IMAGE_CONCURRENCY", "4"))  # Photos processed in parallel
 DAILY_LIMIT = 20
-SR_INTERVALS = {1: 1, 2: 1, 3: 3, 4: 7, 5: 14}  # difficulty -> days
+SR_INTERVALS = {1: 1, 2: 1, 3: 3, 4: 7, 5: 14}  # difficulty -> days (server side: sr_interval_days, migrations/003)
+EDITOR_PAGE_SIZE = 20        # Cards with edit widgets per page in "Redaguoti korteles"
+PREVIEW_PAGE_SIZE = 25       # Cards per page in the export preview
 
 # Character limits
 MAX_PDF_CHARS_FREE = 50000
@@ -422,16 +444,24 @@ DARK_MODE_CSS = """
 """
 
 # Initialize session state
-if 'flashcards' not in st.session_state:
-    st.session_state.flashcards = []
+if 'card_store' not in st.session_state:
+    st.session_state.card_store = CardStore()
 if 'flashcards_count' not in st.session_state:
     st.session_state.flashcards_count = 0
 if 'current_card' not in st.session_state:
     st.session_state.current_card = 0
+if 'review_session' not in st.session_state:
+    st.session_state.review_session = uuid.uuid4().hex  # This tab's writer key in the review buffer
+if 'card_edits' not in st.session_state:
+    st.session_state.card_edits = {}  # card_id -> unsaved {"klausimas", "atsakymas"}
+if 'editor_page' not in st.session_state:
+    st.session_state.editor_page = 0
+if 'export_cache' not in st.session_state:
+    st.session_state.export_cache = {}  # format -> (card store version, file contents)
+if 'preview_page' not in st.session_state:
+    st.session_state.preview_page = 0
 if 'is_premium' not in st.session_state:
     st.session_state.is_premium = False
-if 'study_cards' not in st.session_state:
-    st.session_state.study_cards = {}
 if 'show_answer' not in st.session_state:
     st.session_state.show_answer = False
 if 'generating' not in st.session_state:
@@ -520,9 +550,15 @@ if st.session_state.user is None:
 SESSION_TIMEOUT = 30 * 60  # 30 minutes in seconds
 if st.session_state.user:
     if time.time() - st.session_state.last_activity > SESSION_TIMEOUT:
+        if SUPABASE_AVAILABLE:
+            get_review_buffer().detach(st.session_state.user['id'], st.session_state.review_session)
         st.session_state.user = None
-        st.session_state.flashcards = []
-        st.session_state.study_cards = {}
+        st.session_state.card_store.clear()
+        st.session_state.card_edits = {}
+        st.session_state.export_cache = {}
+        st.session_state.pop('due_queue', None)
+        st.session_state.pop('card_loader', None)
+        st.session_state.pop('card_sync', None)
         streamlit_js_eval(js_expressions="localStorage.removeItem('quantum_user')")
         st.toast("⏰ Sesija baigėsi dėl neaktyvumo. Prisijunkite iš naujo.")
         st.rerun()
@@ -592,11 +628,8 @@ if STRIPE_AVAILABLE and 'session_id' in st.query_params:
 # ==========================
 
 def get_gemini_client(api_key):
-    """Configure and return Gemini client with timeout"""
-    return genai.Client(
-        api_key=api_key,
-        http_options=types.HttpOptions(timeout=30_000)
-    )
+    """Return the shared, connection-pooled Gemini client for this key"""
+    return gemini_client.get_client(api_key)
 
 # ==========================
 # YOUTUBE FUNCTIONS
@@ -701,112 +734,231 @@ def calculate_next_review(difficulty):
     interval_days = SR_INTERVALS.get(difficulty, 3)
     return (datetime.now() + timedelta(days=interval_days)).isoformat()
 
+def card_store():
+    """This session's cards: .flashcards (browsed list) and .study_cards (id -> card) share one record per card"""
+    return st.session_state.card_store
+
 def sync_flashcards_from_supabase(user_id):
-    """Sync data from Supabase to local session state"""
-    result = load_user_flashcards(user_id)
+    """Sync data from Supabase to local session state.
+    After the first load only rows changed since the last sync are fetched;
+    on a full load due cards arrive immediately and the rest streams in via absorb_loaded_cards."""
+    get_review_buffer().attach(user_id, st.session_state.review_session, review_writer(user_id))
+    sync_state = st.session_state.get('card_sync')
+    if sync_state and sync_state['user_id'] == user_id:
+        delta = get_flashcard_changes(user_id, sync_state['watermark'])
+        if delta['success'] and not delta['truncated']:
+            apply_flashcard_changes(user_id, overlay_pending_reviews(user_id, delta['cards']), delta['deleted'])
+            sync_state['watermark'] = delta['watermark']
+            return True
+
+    # Watermark taken before the load so changes made during it are caught next time
+    marker = get_flashcard_changes(user_id)
+    result = load_user_flashcards_lazy(user_id)
     if result['success']:
-        # Update flashcards list
-        st.session_state.flashcards = result['cards']
-        
-        # Update study_cards for Leitner system
-        new_study_cards = {}
-        for card in result['cards']:
-            # Use database ID as key
-            card_id = card.get('id')
-            if card_id:
-                new_study_cards[card_id] = {
-                    "id": card_id,
-                    "question": card.get("klausimas", ""),
-                    "answer": card.get("atsakymas", ""),
-                    "next_review": card.get("next_review", datetime.now().isoformat()),
-                    "difficulty": card.get("difficulty", 3),
-                    "times_reviewed": card.get("times_reviewed", 0)
-                }
-        st.session_state.study_cards = new_study_cards
+        overlay_pending_reviews(user_id, result['cards'])
+
+        # One record per card; flashcards and study_cards (database ID as key) are views of it
+        card_store().replace(result['cards'])
+        st.session_state.pop('due_queue', None)
+        get_user_index(user_id).rebuild(result['cards'])
+        if result['loader'] is not None:
+            get_user_index(user_id).ready = False
+            st.session_state.card_loader = result['loader']
+            st.session_state.server_due_count = server_due_count(user_id, result['due_count'])
+        else:
+            st.session_state.pop('card_loader', None)
+            st.session_state.pop('server_due_count', None)
+        if marker['success']:
+            st.session_state.card_sync = {'user_id': user_id, 'watermark': marker['watermark']}
+        else:
+            st.session_state.pop('card_sync', None)  # Delta RPC not installed: full reloads
         return True
     return False
 
-def add_cards_to_study(flashcards, db_ids=None):
-    """Add generated flashcards to study deck with SR metadata.
+def server_due_count(user_id, due_count):
+    """Due count of the whole deck as loaded with its first page, used while the rest streams in.
+    Grades still in the review buffer have not reached the server; those cards were due when graded."""
+    now = time.time()
+    graded = sum(1 for r in get_review_buffer().pending_by_card(user_id).values()
+                 if review_timestamp(r['next_review']) > now)
+    return max(0, due_count - graded)
+
+def overlay_pending_reviews(user_id, cards):
+    """Grades still waiting in the review buffer win over what the server returned"""
+    pending = get_review_buffer().pending_by_card(user_id)
+    if pending:
+        for card in cards:
+            review = pending.get(card.get('id'))
+            if review:
+                card.update(
+                    difficulty=review['difficulty'],
+                    next_review=review['next_review'],
+                    times_reviewed=review['times_reviewed']
+                )
+    return cards
+
+def apply_flashcard_changes(user_id, changed, deleted):
+    """Merge changed cards and drop deleted ones in session state"""
+    dedup_index = get_user_index(user_id)
+    deleted = set(deleted)
+    changed_by_id = {card['id']: card for card in changed if card['id'] not in deleted}
+    loader = st.session_state.get('card_loader')
+    if loader is not None and deleted:
+        loader.skip(deleted)
+
+    store = card_store()
+    store.remove(deleted)
+    store.append(changed_by_id.values())  # Cards not seen before (e.g. a clone); known ones are skipped
+
+    due_queue = get_due_queue()
+    for card_id in deleted:
+        due_queue.remove(card_id)
+        dedup_index.remove(card_id)
+    for card in changed:
+        if card['id'] not in deleted:
+            record = store.put(card['id'], card)  # Updated in place, so both views see it
+            due_queue.update(record.id, record.next_review_ts, record.difficulty)
+            dedup_index.remove(record.id)
+            dedup_index.add(record.id, record.question, record.answer)
+
+def absorb_loaded_cards():
+    """Merge cards fetched by the background loader since the last rerun"""
+    loader = st.session_state.get('card_loader')
+    user = st.session_state.get('user')
+    if loader is None or not user or loader.user_id != user['id']:
+        st.session_state.pop('card_loader', None)
+        return None
+    store = card_store()
+    cards = [c for c in loader.drain() if c['id'] not in store.study_cards]
+    if cards:
+        overlay_pending_reviews(user['id'], cards)
+        dedup_index = get_user_index(user['id'])
+        due_queue = get_due_queue()
+        store.append(cards)
+        for card in cards:
+            record = store.study_cards[card['id']]
+            due_queue.update(record.id, record.next_review_ts, record.difficulty)
+            dedup_index.add(record.id, record.question, record.answer)
+    if loader.done and not loader.has_pending():
+        if loader.error:
+            st.warning("Nepavyko įkelti visų kortelių. Atnaujinkite puslapį.")
+        else:
+            # Only if the index was not evicted (and recreated empty) while the deck streamed in
+            dedup_index = get_user_index(user['id'])
+            dedup_index.ready = len(dedup_index) >= len(store)
+        del st.session_state.card_loader
+        st.session_state.pop('server_due_count', None)
+        return None
+    return loader
+
+@st.fragment(run_every=2)
+def watch_card_loader():
+    """Rerun the app when more of the deck has arrived"""
+    loader = st.session_state.get('card_loader')
+    if loader is None or loader.done or loader.has_pending():
+        st.rerun()
+    st.caption(f"⏳ Įkeliamos likusios kortelės... ({len(card_store())})")
+
+def get_dedup_index():
+    """Near-duplicate index of the logged-in user's cards (None when logged out)"""
+    user = st.session_state.get('user')
+    return get_user_index(user['id']) if user else None
+
+def add_cards_to_study(flashcards, db_ids=None, set_id=None):
+    """Add generated flashcards to study deck with SR metadata; returns their records.
     Uses database IDs when available so Supabase sync works correctly."""
+    store = card_store()
+    dedup_index = get_dedup_index()
+    due_queue = get_due_queue()
+    records = []
     for i, card in enumerate(flashcards):
         # Use database ID if available, otherwise generate local ID
         if db_ids and i < len(db_ids):
             card_id = str(db_ids[i])
         else:
             card_id = f"card_{datetime.now().timestamp()}_{i}"
-        if card_id not in st.session_state.study_cards:
-            st.session_state.study_cards[card_id] = {
-                "id": card_id,
-                "question": card.get("klausimas", ""),
-                "answer": card.get("atsakymas", ""),
-                "next_review": datetime.now().isoformat(),
-                "difficulty": 3,
-                "times_reviewed": 0
-            }
-
-def get_today_cards():
-    """Get cards that need review today"""
-    today = datetime.now().date()
-    return [
-        card for card in st.session_state.study_cards.values()
-        if datetime.fromisoformat(card["next_review"]).date() <= today
-    ]
+        if card_id not in store.study_cards:
+            record = store.put(card_id, {
+                "set_id": set_id,
+                "klausimas": card.get("klausimas", ""),
+                "atsakymas": card.get("atsakymas", ""),
+            })
+            due_queue.update(card_id, record.next_review_ts, 3)
+            if dedup_index is not None:
+                dedup_index.add(card_id, record.question, record.answer)
+        records.append(store.study_cards[card_id])
+    return records
+
+def get_due_queue():
+    """Due queue over study_cards (rebuilt once after the deck is replaced, then kept in step)"""
+    queue = st.session_state.get('due_queue')
+    if queue is None:
+        queue = st.session_state.due_queue = DueQueue.from_cards(card_store().study_cards.values())
+    queue.refresh()
+    return queue
 
 def update_card_difficulty(card_id, difficulty):
     """Update card difficulty and schedule next review"""
-    if card_id in st.session_state.study_cards:
-        card = st.session_state.study_cards[card_id]
-        card["difficulty"] = difficulty
-        card["times_reviewed"] = card.get("times_reviewed", 0) + 1
+    card = card_store().study_cards.get(card_id)
+    if card is not None:
+        card.difficulty = difficulty
+        card.times_reviewed = (card.times_reviewed or 0) + 1
         card["next_review"] = calculate_next_review(difficulty)
+        due_queue = get_due_queue()
+        if st.session_state.get('server_due_count') and due_queue.is_due(card_id):
+            st.session_state.server_due_count -= 1  # Keep the load-time server count in step locally
+        due_queue.update(card_id, card.next_review_ts, difficulty)
 
-        # Sync with Supabase only if card has a DB ID (not local card_* format)
+        # Sync with Supabase only if card has a DB ID (not local card_* format).
+        # Write-behind: journaled now, flushed in batches by the review buffer.
         if st.session_state.user and SUPABASE_AVAILABLE and not card_id.startswith("card_"):
-            update_card_progress(card_id, difficulty)
-            update_streak(st.session_state.user['id'])
+            get_review_buffer().record(st.session_state.user['id'], {
+                "card_id": card_id,
+                "difficulty": difficulty,
+                "times_reviewed": card.times_reviewed,
+                "next_review": card.next_review,
+            })
+
+def record_card_edit(card_id):
+    """Widget callback: keep the editor's text as a dirty record until it is saved"""
+    card = card_store().study_cards.get(card_id)
+    if card is None:
+        return
+    question = st.session_state.get(f"q_{card_id}", card.question)
+    answer = st.session_state.get(f"a_{card_id}", card.answer)
+    if question == card.question and answer == card.answer:
+        st.session_state.card_edits.pop(card_id, None)
+    else:
+        st.session_state.card_edits[card_id] = {"klausimas": question, "atsakymas": answer}
+
+def save_card_edits(card_ids=None):
+    """Apply dirty records (all of them, or just card_ids) to the card store"""
+    edits = st.session_state.card_edits
+    store = card_store()
+    dedup_index = get_dedup_index()
+    for card_id in list(edits if card_ids is None else card_ids):
+        edit = edits.pop(card_id, None)
+        card = store.study_cards.get(card_id)
+        if edit is None or card is None:
+            continue
+        if dedup_index is not None and (edit["klausimas"], edit["atsakymas"]) != (card.question, card.answer):
+            dedup_index.remove(card_id)
+            dedup_index.add(card_id, edit["klausimas"], edit["atsakymas"])
+        card.question, card.answer = edit["klausimas"], edit["atsakymas"]
+        store.mark_changed()
 
 # ==========================
 # FLASHCARD GENERATION
 # ==========================
 
 def parse_flashcards_json(content):
-    """Parse JSON flashcards from AI response with fallback"""
-    # Strip markdown code blocks
-    if "```json" in content:
-        content = content.split("```json")[1].split("```")[0]
-    elif "```" in content:
-        content = content.split("```")[1].split("```")[0]
-
-    # Try direct parse first
-    try:
-        flashcards = json.loads(content.strip())
-    except json.JSONDecodeError:
-        match = re.search(r'\[.*\]', content, re.DOTALL)
-        if match:
-            flashcards = json.loads(match.group())
-        else:
-            return []
-
-    if not isinstance(flashcards, list):
-        return []
-
-    # Validate card structure
-    return [
-        card for card in flashcards
-        if isinstance(card, dict) and 'klausimas' in card and 'atsakymas' in card
-    ]
-
-def generate_flashcards_from_text(text, num_cards=10, language="lietuvių", api_key=None):
-    """Generate flashcards using Gemini API"""
-    if not api_key:
-        st.error("API raktas nenustatytas. Susisiekite su administratoriumi arba bandykite vėliau.")
-        return []
+    """Parse flashcards from AI response in one pass.
+    Tolerates code fences, surrounding text, truncated output and alternate key names."""
+    return parse_cards(content)
 
-    try:
-        client = get_gemini_client(api_key)
-
-        prompt = f"""Tu esi ekspertas akademinis asistentas, besispecializuojantis aktyvaus prisiminimo (active recall) metodikoje.
+def build_flashcards_prompt(text, num_cards, language):
+    """Build the active-recall generation prompt"""
+    return f"""Tu esi ekspertas akademinis asistentas, besispecializuojantis aktyvaus prisiminimo (active recall) metodikoje.
 
 METODIKA (Active Recall):
 - VENK bendrų klausimų tipo "Kas yra X?"
@@ -824,7 +976,7 @@ UŽDUOTIS:
 Sukuriame {num_cards} kortelių iš šio teksto {language} kalba.
 
 TEKSTAS:
-{text[:get_limit('chars')]}
+{text}
 
 GRĄŽINK TIK JSON ARRAY formatu (be jokio papildomo teksto):
 [
@@ -833,31 +985,370 @@ GRĄŽINK TIK JSON ARRAY formatu (be jokio papildomo teksto):
 ]
 """
 
-        response = client.models.generate_content(
-            model=GEMINI_MODEL,
-            contents=prompt
-        )
-
-        if not response.text:
-            st.error("Nepavyko apdoroti teksto. Pabandykite su trumpesniu tekstu.")
-            return []
+def request_flashcards(text, num_cards, language, api_key):
+    """Call Gemini once and parse the cards (raises on API errors, no UI calls)"""
+    client = get_gemini_client(api_key)
+    response = call_gemini(lambda: client.models.generate_content(
+        model=GEMINI_MODEL,
+        contents=build_flashcards_prompt(text, num_cards, language)
+    ))
+    if not response.text:
+        return []
+    return parse_flashcards_json(response.text)
+
+def show_generation_error(e):
+    """Map a Gemini exception (or a failed job's error text) to a user-facing error"""
+    err = str(e).lower()
+    if isinstance(e, RateLimitTimeout) or "ratelimittimeout" in err:
+        st.error("Šiuo metu kortelės kuriamos daugeliui vartotojų. Palaukite minutę ir bandykite dar kartą.")
+    elif "quota" in err or "429" in err:
+        st.error("Serveris šiuo metu užimtas. Palaukite minutę ir bandykite dar kartą.")
+    elif "timeout" in err:
+        st.error("Užtruko per ilgai. Pabandykite su trumpesniu tekstu.")
+    elif "invalid" in err and "key" in err:
+        st.error("Neteisingas API raktas. Patikrinkite nustatymuose ir bandykite dar kartą.")
+    else:
+        st.error("Nepavyko sukurti kortelių. Bandykite dar kartą arba su kitu tekstu.")
+
+def cached_request_flashcards(text, num_cards, language, api_key):
+    """request_flashcards behind the process-wide generation cache"""
+    cache_key = make_cache_key(text, num_cards, language, GEMINI_MODEL, PROMPT_VERSION)
+    return get_generation_cache().get_or_compute(
+        cache_key,
+        lambda: request_flashcards(text, num_cards, language, api_key),
+        expected=num_cards
+    )
 
-        return parse_flashcards_json(response.text)
+# ---- Map-reduce for long inputs ----
+
+_HEADING_RE = re.compile(r'^(#{1,6}\s|\d+(\.\d+)*[.)]?\s+\S|[A-ZĄČĘĖĮŠŲŪŽ][A-ZĄČĘĖĮŠŲŪŽ0-9 ,:-]{3,}$)')
+_SENTENCE_END_RE = re.compile(r'(?<=[.!?])\s+')
+
+def estimate_tokens(text):
+    """Rough token estimate (~4 characters per token)"""
+    return len(text) // CHARS_PER_TOKEN + 1
+
+def split_text_into_chunks(text, max_tokens=None):
+    """Split text on heading/paragraph boundaries into chunks of at most max_tokens"""
+    max_tokens = max_tokens or CHUNK_MAX_TOKENS
+    if estimate_tokens(text) <= max_tokens:
+        return [text]
+    max_chars = max_tokens * CHARS_PER_TOKEN
+
+    # Paragraphs; a heading line always starts a new block
+    blocks = []
+    current = []
+    for line in text.splitlines():
+        stripped = line.strip()
+        if not stripped or _HEADING_RE.match(stripped):
+            if current:
+                blocks.append("\n".join(current))
+                current = []
+            if not stripped:
+                continue
+        current.append(line)
+    if current:
+        blocks.append("\n".join(current))
+
+    # Oversized blocks: fall back to sentences, then to a hard cut
+    pieces = []
+    for block in blocks:
+        if len(block) <= max_chars:
+            pieces.append(block)
+            continue
+        for sentence in _SENTENCE_END_RE.split(block):
+            while len(sentence) > max_chars:
+                pieces.append(sentence[:max_chars])
+                sentence = sentence[max_chars:]
+            if sentence:
+                pieces.append(sentence)
+
+    chunks = []
+    buffer = []
+    buffer_len = 0
+    for piece in pieces:
+        if buffer and buffer_len + len(piece) + 2 > max_chars:
+            chunks.append("\n\n".join(buffer))
+            buffer = []
+            buffer_len = 0
+        buffer.append(piece)
+        buffer_len += len(piece) + 2
+    if buffer:
+        chunks.append("\n\n".join(buffer))
+    return chunks
+
+def card_dedup_key(card):
+    """Normalized question used to spot duplicates across chunks"""
+    return re.sub(r'[\W_]+', ' ', card.get('klausimas', '').lower()).strip()
+
+def merge_flashcards(chunk_cards, quotas, num_cards):
+    """Merge per-chunk results: dedupe, honor each chunk's quota, then fill up in document order"""
+    seen = set()
+    unique = []
+    for cards in chunk_cards:
+        kept = []
+        for card in cards:
+            key = card_dedup_key(card)
+            if key and key not in seen:
+                seen.add(key)
+                kept.append(card)
+        unique.append(kept)
+
+    picked = [cards[:quota] for cards, quota in zip(unique, quotas)]
+    leftovers = [cards[quota:] for cards, quota in zip(unique, quotas)]
+    missing = num_cards - sum(len(p) for p in picked)
+    for i, extra in enumerate(leftovers):
+        if missing <= 0:
+            break
+        picked[i].extend(extra[:missing])
+        missing -= len(extra[:missing])
+
+    merged = [card for cards in picked for card in cards]
+    return merged[:num_cards]
+
+def chunk_quotas(chunks, num_cards):
+    """Cards per chunk in proportion to its length, adding up to exactly num_cards.
+    Rounds along the running total, so when there are fewer cards than chunks
+    the ones that get a card are spread over the whole document."""
+    total_len = sum(len(c) for c in chunks)
+    quotas = []
+    done = 0
+    given = 0
+    for chunk in chunks:
+        done += len(chunk)
+        target = round(num_cards * done / total_len)
+        quotas.append(target - given)
+        given = target
+    return quotas
+
+def generate_flashcards_chunked(chunks, num_cards, language, api_key):
+    """Generate cards per chunk on a bounded pool (chunks with no quota are not requested).
+    Returns (cards, failed_chunks, requested_chunks, first_error)."""
+    quotas = chunk_quotas(chunks, num_cards)
+    # Ask for a few extra per chunk so deduplication can still reach num_cards
+    requested = {i: min(num_cards, q + max(1, q // 3)) for i, q in enumerate(quotas) if q}
+
+    results = [[] for _ in chunks]
+    failed = 0
+    first_error = None
+    with ThreadPoolExecutor(max_workers=min(CHUNK_WORKERS, len(requested))) as pool:
+        futures = {
+            pool.submit(cached_request_flashcards, chunks[i], n, language, api_key): i
+            for i, n in requested.items()
+        }
+        for future in as_completed(futures):
+            try:
+                results[futures[future]] = future.result()
+            except Exception as e:
+                failed += 1
+                first_error = first_error or e
+
+    return merge_flashcards(results, quotas, num_cards), failed, len(requested), first_error
+
+def stream_flashcards(text, num_cards, language, api_key, on_stream=None):
+    """Yield cards one by one as soon as each is complete in the Gemini stream (no UI calls).
+    Identical concurrent requests share one stream through the generation cache;
+    on_stream() is called only when this caller opens a real Gemini stream."""
+    cache_key = make_cache_key(text, num_cards, language, GEMINI_MODEL, PROMPT_VERSION)
+
+    def produce():
+        client = get_gemini_client(api_key)
 
-    except Exception as e:
-        err = str(e).lower()
-        if "quota" in err or "429" in err:
-            st.error("Serveris šiuo metu užimtas. Palaukite minutę ir bandykite dar kartą.")
-        elif "timeout" in err:
-            st.error("Užtruko per ilgai. Pabandykite su trumpesniu tekstu.")
-        elif "invalid" in err and "key" in err:
-            st.error("Neteisingas API raktas. Patikrinkite nustatymuose ir bandykite dar kartą.")
+        def open_stream():
+            # Pull the first chunk here so a 429 surfaces inside call_gemini and gets retried
+            stream = iter(client.models.generate_content_stream(
+                model=GEMINI_MODEL,
+                contents=build_flashcards_prompt(text, num_cards, language)
+            ))
+            return next(stream, None), stream
+
+        first_chunk, stream = call_gemini(open_stream)
+        if on_stream is not None:
+            on_stream()
+        chunks = itertools.chain([first_chunk] if first_chunk is not None else [], stream)
+        yield from iter_cards(chunk.text for chunk in chunks)
+
+    yield from get_generation_cache().stream_or_compute(cache_key, produce, expected=num_cards)
+
+def text_generation_job(job, text, num_cards, language, api_key):
+    """Background job body for text, PDF and YouTube sources (runs on the job pool, no UI calls)"""
+    chunks = split_text_into_chunks(text)
+    if len(chunks) > 1:
+        cards, failed, requested, first_error = generate_flashcards_chunked(chunks, num_cards, language, api_key)
+        if failed == requested:
+            raise first_error
+        if failed:
+            job.warn(f"Dalis teksto ({failed}/{requested} dalių) neapdorota — sukurtos kortelės iš likusių.")
+        job.add_cards(cards)
+        return
+
+    started = time.time()
+    streamed = []  # Empty when the cards were replayed from the cache or another job's stream
+    try:
+        for card in stream_flashcards(text, num_cards, language, api_key,
+                                      on_stream=lambda: streamed.append(True)):
+            if not job.cards and streamed:
+                metrics.record("time_to_first_card", time.time() - job.submitted_at)
+            job.add_cards([card])
+    except Exception:
+        if not job.cards:
+            raise
+        job.warn("Generavimas nutrūko — išsaugomos jau sukurtos kortelės.")
+    metrics.record("generation_total", time.time() - started)
+
+def photo_generation_job(job, images, num_cards, api_key):
+    """Background job body for photos: images run in parallel, failures stay per image"""
+    results = [[] for _ in images]
+    done = 0
+    with ThreadPoolExecutor(max_workers=min(IMAGE_WORKERS, len(images))) as pool:
+        futures = {
+            pool.submit(generate_flashcards_from_image, data, mime, num_cards, api_key): idx
+            for idx, (data, mime) in enumerate(images)
+        }
+        for future in as_completed(futures):
+            idx = futures[future]
+            done += 1
+            try:
+                cards = future.result()
+                if cards is None:
+                    job.warn(f"Nepavyko atpažinti nuotraukos {idx+1} turinio.")
+                elif cards:
+                    results[idx] = cards
+                    job.add_cards(cards)
+                else:
+                    job.warn(f"Nepavyko sukurti kortelių iš nuotraukos {idx+1}.")
+            except Exception as e:
+                if "timeout" in str(e).lower():
+                    job.warn(f"Nuotrauka {idx+1} — užtruko per ilgai, praleista.")
+                else:
+                    job.warn(f"Nuotrauka {idx+1} — nepavyko apdoroti.")
+            job.set_progress(done / len(images))
+
+    # Keep upload order regardless of completion order
+    job.replace_cards([card for cards in results for card in cards])
+
+def submit_generation_job(kind, requested, fn, *args):
+    """Queue a generation of up to `requested` cards on the background pool for the current user.
+    Refused up front if it would not fit in today's quota, so no Gemini call is wasted."""
+    remaining = get_limit('daily') - st.session_state.flashcards_count
+    if requested > remaining:
+        st.error(f"Šiandien dar galite sukurti {max(remaining, 0)} kortelių. Sumažinkite kiekį arba atnaujinkite Premium.")
+        return
+    if get_job_runner().submit(st.session_state.user['id'], kind, fn, *args) is None:
+        st.warning("Kortelės jau kuriamos. Palaukite, kol baigsis ankstesnis generavimas.")
+        return
+    st.rerun()
+
+def collect_finished_jobs():
+    """Pick up finished jobs of this user (works after reruns and reconnects)"""
+    jobs = get_job_runner().store.list_unclaimed(st.session_state.user['id'])
+    active = [j for j in jobs if j['status'] in ACTIVE_STATUSES]
+    collected = []
+    for job in jobs:
+        if job['status'] in FINISHED_STATUSES:
+            claimed = get_job_runner().store.claim(job['id'])
+            if claimed:
+                collected.append(claimed)
+
+    cards = []
+    for job in collected:
+        # Shown after save_generated_cards' rerun
+        st.session_state.generation_warnings = st.session_state.get('generation_warnings', []) + job['warnings']
+        if job['status'] == 'failed' and not job['cards']:
+            show_generation_error(job['error'] or "")
+        elif not job['cards']:
+            if job['kind'] == 'photo':
+                st.error("Nepavyko sukurti kortelių iš nuotraukų. Pabandykite kitas.")
+            else:
+                st.error("Nepavyko apdoroti teksto. Pabandykite su trumpesniu tekstu.")
+        cards.extend(job['cards'])
+    if cards:
+        save_generated_cards(cards)
+    return active
+
+@st.fragment(run_every=1.5)
+def render_active_jobs():
+    """Poll running jobs and show their cards as they stream in"""
+    jobs = get_job_runner().store.list_unclaimed(st.session_state.user['id'])
+    if any(j['status'] in FINISHED_STATUSES for j in jobs) or not jobs:
+        st.rerun()  # Full run so collect_finished_jobs saves the result
+    for job in jobs:
+        if job['kind'] == 'photo':
+            st.progress(job['progress'], text=f"Analizuojamos nuotraukos... ({len(job['cards'])} kortelių)")
         else:
-            st.error("Nepavyko sukurti kortelių. Bandykite dar kartą arba su kitu tekstu.")
-        return []
+            st.info(f"Kuriamos kortelės... ({len(job['cards'])} sukurta)")
+        for i, card in enumerate(job['cards'], 1):
+            st.markdown(f"**{i}. {html.escape(card['klausimas'])}**")
+            st.caption(f"↳ {html.escape(card['atsakymas'])}")
+
+def prepare_image(data, content_type):
+    """Decode, downscale and re-encode an uploaded image. Returns (bytes, mime_type)."""
+    image = Image.open(BytesIO(data))
+
+    # Keep original format when possible
+    img_format = (content_type or '').split('/')[-1].upper()
+    if img_format == 'JPG':
+        img_format = 'JPEG'
+    if img_format not in ('JPEG', 'PNG', 'WEBP'):
+        img_format = 'PNG'
+
+    # Resize image if too large
+    max_size = 1600
+    if image.width > max_size or image.height > max_size:
+        image.thumbnail((max_size, max_size), Image.Resampling.LANCZOS)
+
+    img_buffer = BytesIO()
+    image.save(img_buffer, format=img_format)
+
+    mime_type = f"image/{img_format.lower()}"
+    if img_format == 'JPEG':
+        mime_type = "image/jpeg"
+    return img_buffer.getvalue(), mime_type
+
+def generate_flashcards_from_image(data, content_type, num_cards, api_key):
+    """Generate cards from one photo (thread-safe, no UI calls).
+    Returns None when Gemini returned no text; raises on API errors."""
+    img_bytes, mime_type = prepare_image(data, content_type)
+
+    prompt = f"""Tu esi ekspertas akademinis asistentas.
+
+Išanalizuok šią nuotrauką (tai gali būti užrašai, lenta, skaidrė ar vadovėlis).
+Sukurk {num_cards} kortelių lietuvių kalba.
+
+GRĄŽINK TIK JSON ARRAY formatu:
+[
+  {{"klausimas": "...", "atsakymas": "..."}}
+]"""
+
+    image_part = types.Part.from_bytes(
+        data=img_bytes,
+        mime_type=mime_type
+    )
+
+    client = get_gemini_client(api_key)
+    response = call_gemini(lambda: client.models.generate_content(
+        model=GEMINI_MODEL,
+        contents=[prompt, image_part]
+    ))
+
+    if not response.text:
+        return None
+    return parse_flashcards_json(response.text)
 
 def save_generated_cards(cards):
     """Save generated cards to session state and trigger success"""
+    dedup_index = get_dedup_index()
+    if dedup_index is not None and not dedup_index.ready and st.session_state.get('card_loader') is None:
+        dedup_index.rebuild(card_store().study_cards.values())  # Evicted from the process-wide LRU since login
+    if cards and dedup_index is not None:
+        cards, duplicates = dedup_index.split_new(cards)
+        if duplicates and not cards:
+            st.info("Visos sukurtos kortelės jau yra jūsų rinkiniuose.")
+            return
+        if duplicates:
+            st.session_state.generation_warnings = st.session_state.get('generation_warnings', []) + [
+                f"Praleista {len(duplicates)} kortelių, kurios beveik sutampa su jau turimomis."
+            ]
     if cards:
         # Server-side limit check before saving
         if st.session_state.user and SUPABASE_AVAILABLE:
@@ -869,6 +1360,7 @@ def save_generated_cards(cards):
                 return
 
         db_card_ids = []
+        set_id = None
 
         # Save to Supabase if logged in
         if st.session_state.user and SUPABASE_AVAILABLE:
@@ -877,14 +1369,16 @@ def save_generated_cards(cards):
                 result = save_flashcard_set(st.session_state.user['id'], set_name, cards)
                 if result.get('success'):
                     db_card_ids = result.get('card_ids', [])
+                    set_id = result.get('set_id')
 
-            # Increment daily usage in DB
-            increment_daily_usage(st.session_state.user['id'], len(cards))
+            # Increment daily usage in DB (returns today's new total)
+            usage_total = increment_daily_usage(st.session_state.user['id'], len(cards))
+        else:
+            usage_total = 0
 
-        st.session_state.flashcards = cards
-        st.session_state.flashcards_count += len(cards)
+        st.session_state.flashcards_count = usage_total or st.session_state.flashcards_count + len(cards)
         st.session_state.current_card = 0
-        add_cards_to_study(cards, db_card_ids)
+        card_store().flashcards = add_cards_to_study(cards, db_card_ids, set_id)
         st.session_state.generation_success = len(cards)
         st.rerun()
 
@@ -892,35 +1386,42 @@ def save_generated_cards(cards):
 # PDF EXTRACT
 # ==========================
 
-@st.cache_data
-def extract_text_from_pdf(pdf_file):
-    """Extract text from uploaded PDF"""
+@st.cache_data(max_entries=64, show_spinner=False)
+def count_pdf_pages(pdf_hash, _pdf_bytes):
+    """Page count, cached by file content hash"""
+    return pdf_extract.count_pages(_pdf_bytes)
+
+@st.cache_data(max_entries=32, show_spinner=False)
+def _extract_pdf_cached(pdf_hash, first_page, last_page, max_chars, _pdf_bytes):
+    """Extraction result cached by (content hash, page range, limit) — shared by all sessions.
+    Raises on unreadable PDFs, so failures are not cached."""
+    return pdf_extract.extract_text(_pdf_bytes, max_chars, first_page, last_page)
+
+def extract_text_from_pdf(pdf_bytes, first_page=0, last_page=None):
+    """Extract text from uploaded PDF, stopping once the tier's character limit is reached"""
+    max_chars = MAX_PREMIUM_CHARS if st.session_state.get('is_premium', False) else MAX_PDF_CHARS_FREE
+    pdf_hash = hashlib.sha256(pdf_bytes).hexdigest()
     try:
-        pdf_reader = PyPDF2.PdfReader(pdf_file)
-        text = ""
-        for page in pdf_reader.pages:
-            page_text = page.extract_text()
-            if page_text:
-                text += page_text + "\n"
-
-        clean_text = text.strip()
-        if len(clean_text) < 50 and len(pdf_reader.pages) > 0:
-            st.warning("Atrodo, kad šis PDF yra skanuotas vaizdas. Pabandykite naudoti Nuotraukos režimą.")
-            return ""
-
-        if len(text) > MAX_PDF_CHARS_FREE:
-            truncated = text[:MAX_PDF_CHARS_FREE]
-            last_period = truncated.rfind('.')
-            if last_period > MAX_PDF_CHARS_FREE * 0.8:
-                truncated = truncated[:last_period + 1]
-            text = truncated
-            st.info("Nuskaitytas maksimalus teksto kiekis iš PDF.")
-
-        return text
+        result = _extract_pdf_cached(pdf_hash, first_page, last_page, max_chars, pdf_bytes)
     except Exception:
         st.error("Nepavyko nuskaityti PDF. Patikrinkite, ar failas neapribotas slaptažodžiu.")
         return ""
 
+    text = result['text']
+    if len(text.strip()) < 50 and result['pages_read'] > 0:
+        st.warning("Atrodo, kad šis PDF yra skanuotas vaizdas. Pabandykite naudoti Nuotraukos režimą.")
+        return ""
+
+    if result['truncated']:
+        truncated = text[:max_chars]
+        last_period = truncated.rfind('.')
+        if last_period > max_chars * 0.8:
+            truncated = truncated[:last_period + 1]
+        text = truncated
+        st.info(f"Nuskaitytas maksimalus teksto kiekis iš PDF ({result['pages_read']} psl.). Pasirinkite kitus puslapius, jei reikia tolimesnės dalies.")
+
+    return text
+
 # ==========================
 # EXPORT FUNCTIONS
 # ==========================
@@ -948,10 +1449,56 @@ def export_to_quizlet_json(flashcards):
 
 def export_to_txt(flashcards):
     """Export flashcards to simple TXT format"""
-    output = ""
-    for i, card in enumerate(flashcards, 1):
-        output += f"{i}. {card['klausimas']}\n   → {card['atsakymas']}\n\n"
-    return output
+    return "".join(
+        f"{i}. {card['klausimas']}\n   → {card['atsakymas']}\n\n"
+        for i, card in enumerate(flashcards, 1)
+    )
+
+def export_to_print_html(flashcards):
+    """Export flashcards to a printable HTML table"""
+    rows = "".join(
+        f"<tr><td>{html.escape(c['klausimas'])}</td><td>{html.escape(c['atsakymas'])}</td></tr>"
+        for c in flashcards
+    )
+    return f"""
+    <style>
+        @media print {{ .page-break {{ page-break-after: always; }} }}
+        table {{ width: 100%; border-collapse: collapse; margin-top: 20px; }}
+        td, th {{ border: 1px solid #333; padding: 15px; }}
+        th {{ background-color: #667eea; color: white; }}
+    </style>
+    <h2>Mano Kortelės</h2>
+    <table>
+        <tr><th>Klausimas</th><th>Atsakymas</th></tr>
+    {rows}</table>"""
+
+# format -> (button label, builder, file name prefix, extension, mime)
+EXPORT_FORMATS = {
+    "anki": ("Anki (CSV)", export_to_anki_csv, "flashcards_anki_", "csv", "text/csv"),
+    "quizlet": ("Quizlet (JSON)", export_to_quizlet_json, "flashcards_quizlet_", "json", "application/json"),
+    "txt": ("Tekstas (TXT)", export_to_txt, "flashcards_", "txt", "text/plain"),
+    "print": ("Spausdinimui (HTML)", export_to_print_html, "korteles_print", "html", "text/html"),
+}
+
+def export_button(fmt, flashcards, version):
+    """Download button for a prepared export, or a button that prepares it (exports are built on request only)"""
+    label, builder, prefix, ext, mime = EXPORT_FORMATS[fmt]
+    cached = st.session_state.export_cache.get(fmt)
+    if cached is None or cached[0] != version:
+        if not st.button(f"📄 Paruošti: {label}", key=f"prepare_{fmt}", use_container_width=True):
+            return
+        started = time.time()
+        cached = st.session_state.export_cache[fmt] = (version, builder(flashcards))
+        metrics.record("export_build", time.time() - started)
+    stamp = "" if fmt == "print" else datetime.now().strftime('%Y%m%d')
+    st.download_button(
+        label=f"⬇️ {label}",
+        data=cached[1],
+        file_name=f"{prefix}{stamp}.{ext}",
+        mime=mime,
+        key=f"download_{fmt}",
+        use_container_width=True
+    )
 
 # ==========================
 # UI LAYOUT
@@ -1124,10 +1671,16 @@ with nav_col3:
         st.markdown(f"<div style='padding-top: 5px; color: {email_color}; text-align: center;'><b>{st.session_state.user['email']}</b></div>", unsafe_allow_html=True)
     with nc3:
         if st.button("Atsijungti", key="nav_logout", use_container_width=True):
+            if SUPABASE_AVAILABLE:
+                get_review_buffer().detach(st.session_state.user['id'], st.session_state.review_session)
             sign_out()
             st.session_state.user = None
-            st.session_state.flashcards = []
-            st.session_state.study_cards = {}
+            st.session_state.card_store.clear()
+            st.session_state.card_edits = {}
+            st.session_state.export_cache = {}
+            st.session_state.pop('due_queue', None)
+            st.session_state.pop('card_loader', None)
+            st.session_state.pop('card_sync', None)
             streamlit_js_eval(js_expressions="localStorage.removeItem('quantum_user')")
             st.rerun()
 
@@ -1153,7 +1706,42 @@ if is_admin():
         )
         st.info("Šis raktas naudojamas tik sesijos metu, jei norite perrašyti serverio numatytąjį raktą.")
 
-can_generate = st.session_state.flashcards_count < get_limit('daily')
+        st.subheader("Generavimo podėlis")
+        cache_stats = get_generation_cache().stats()
+        cs1, cs2, cs3, cs4 = st.columns(4)
+        cs1.metric("Pataikymai (RAM)", cache_stats['memory_hits'])
+        cs2.metric("Pataikymai (diskas)", cache_stats['disk_hits'])
+        cs3.metric("Sujungti užklausimai", cache_stats['coalesced'])
+        cs4.metric("Gemini užklausos", cache_stats['misses'])
+        st.caption(f"Pataikymo dažnis: {cache_stats['hit_rate']:.0%} · Įrašų atmintyje: {cache_stats['memory_entries']} · Diske: {cache_stats['disk_bytes'] / 1024:.0f} KB")
+        ttfc = metrics.timing("time_to_first_card")
+        gen_total = metrics.timing("generation_total")
+        st.caption(f"Laikas iki pirmos kortelės: p50 {ttfc['p50']:.1f} s · p95 {ttfc['p95']:.1f} s ({ttfc['count']} gen.) · Visas generavimas: p50 {gen_total['p50']:.1f} s")
+        conn_stats = gemini_client.connection_stats()
+        st.caption(f"Gemini ryšiai: atidaryta {conn_stats['connections_opened']} · užklausų {conn_stats['requests']} · pakartotinio naudojimo dalis {conn_stats['reuse_ratio']:.0%}")
+        limiter_stats = get_limiter().stats()
+        queue_wait = metrics.timing("gemini_queue_wait")
+        st.caption(f"Gemini eilė: dabar {limiter_stats['queue_depth']} (maks. {limiter_stats['max_queue_depth']}) · laukimas p95 {queue_wait['p95']:.1f} s · 429 pakartojimai {metrics.counter('gemini_429_retries')} · eilės laiko viršijimai {metrics.counter('gemini_queue_timeouts')} · limitas {limiter_stats['rpm']:.0f}/min")
+        insert_rate = metrics.timing("card_insert_rows_per_sec")
+        st.caption(f"Kortelių įrašymas: p50 {insert_rate['p50']:.0f} eil./s · paskutinis {insert_rate['last']:.0f} eil./s ({insert_rate['count']} rink.) · atšaukta {metrics.counter('card_insert_rollbacks')}")
+        st.caption(f"Bendruomenės podėlis: pataikymai {metrics.counter('community_cache_hits')} · praleidimai {metrics.counter('community_cache_misses')} · panaikinta {metrics.counter('community_cache_invalidations')}")
+        job_counts = get_job_runner().store.counts()
+        st.caption(f"Foniniai darbai: eilėje {job_counts.get('queued', 0)} · vykdomi {job_counts.get('running', 0)} · baigti {job_counts.get('done', 0)} · nepavykę {job_counts.get('failed', 0)}")
+        if st.button("🗑️ Išvalyti podėlį", key="clear_generation_cache"):
+            get_generation_cache().clear()
+            st.rerun()
+
+# Rest of the deck streamed in after login
+if absorb_loaded_cards() is not None:
+    watch_card_loader()
+
+# Results of background generations (also after a refresh or reconnect)
+active_jobs = collect_finished_jobs()
+for warning in st.session_state.pop('generation_warnings', []):
+    st.warning(warning)
+
+# One generation at a time per user (JobRunner also refuses a second one, e.g. from another tab)
+can_generate = not active_jobs and st.session_state.flashcards_count < get_limit('daily')
 
 # ==================
 # TAB 1: ŠALTINIS
@@ -1161,6 +1749,9 @@ can_generate = st.session_state.flashcards_count < get_limit('daily')
 with tab1:
     st.header("Iš ko norite sukurti korteles?")
 
+    if active_jobs:
+        render_active_jobs()
+
     source_type = st.radio(
         "Pasirinkite medžiagos tipą:",
         ["✍️ Tekstas", "📄 PDF Failas", "🎥 YouTube Video", "📸 Nuotrauka"],
@@ -1190,9 +1781,7 @@ with tab1:
                 if not api_key:
                     st.error("API raktas nenustatytas. Susisiekite su administratoriumi arba bandykite vėliau.")
                 else:
-                    with st.spinner("Kuriamos kortelės..."):
-                        cards = generate_flashcards_from_text(input_text, num_cards, language, api_key)
-                        save_generated_cards(cards)
+                    submit_generation_job('text', num_cards, text_generation_job, input_text[:get_limit('chars')], num_cards, language, api_key)
 
     # ---- PDF ----
     elif source_type == "📄 PDF Failas":
@@ -1203,8 +1792,16 @@ with tab1:
         )
 
         if uploaded_pdf:
+            pdf_bytes = uploaded_pdf.getvalue()
+            total_pages = count_pdf_pages(hashlib.sha256(pdf_bytes).hexdigest(), pdf_bytes)
+            first_page, last_page = 1, total_pages
+            if total_pages > 1:
+                first_page, last_page = st.slider(
+                    "Puslapiai:", 1, total_pages, (1, total_pages), key="pdf_pages"
+                )
+
             with st.spinner("Skaitomas PDF..."):
-                pdf_text = extract_text_from_pdf(uploaded_pdf)
+                pdf_text = extract_text_from_pdf(pdf_bytes, first_page - 1, last_page)
 
             if pdf_text:
                 st.info(f"PDF nuskaitytas sėkmingai ({len(pdf_text):,} simbolių)")
@@ -1216,9 +1813,7 @@ with tab1:
                     if not api_key:
                         st.error("API raktas nenustatytas. Susisiekite su administratoriumi arba bandykite vėliau.")
                     else:
-                        with st.spinner("Kuriamos kortelės iš PDF..."):
-                            cards = generate_flashcards_from_text(pdf_text, num_cards_pdf, "lietuvių", api_key)
-                            save_generated_cards(cards)
+                        submit_generation_job('pdf', num_cards_pdf, text_generation_job, pdf_text[:get_limit('chars')], num_cards_pdf, "lietuvių", api_key)
 
     # ---- YOUTUBE ----
     elif source_type == "🎥 YouTube Video":
@@ -1266,9 +1861,7 @@ with tab1:
                     if not api_key:
                         st.error("API raktas nenustatytas. Susisiekite su administratoriumi arba bandykite vėliau.")
                     else:
-                        with st.spinner("Kuriamos kortelės..."):
-                            cards = generate_flashcards_from_text(transcript, num_cards_yt, "lietuvių", api_key)
-                            save_generated_cards(cards)
+                        submit_generation_job('youtube', num_cards_yt, text_generation_job, transcript[:get_limit('chars')], num_cards_yt, "lietuvių", api_key)
 
     # ---- NUOTRAUKA ----
     elif source_type == "📸 Nuotrauka":
@@ -1296,72 +1889,8 @@ with tab1:
                 if not api_key:
                     st.error("API raktas nenustatytas. Susisiekite su administratoriumi arba bandykite vėliau.")
                 else:
-                    all_cards = []
-                    for idx, uploaded_image in enumerate(uploaded_images):
-                        with st.spinner(f"Analizuojama nuotrauka {idx+1}/{len(uploaded_images)}..."):
-                            try:
-                                client = get_gemini_client(api_key)
-                                image = Image.open(uploaded_image)
-
-                                # Keep original format when possible
-                                img_format = uploaded_image.type.split('/')[-1].upper()
-                                if img_format == 'JPG':
-                                    img_format = 'JPEG'
-                                if img_format not in ('JPEG', 'PNG', 'WEBP'):
-                                    img_format = 'PNG'
-
-                                # Resize image if too large
-                                max_size = 1600
-                                if image.width > max_size or image.height > max_size:
-                                    image.thumbnail((max_size, max_size), Image.Resampling.LANCZOS)
-
-                                img_buffer = BytesIO()
-                                image.save(img_buffer, format=img_format)
-                                img_bytes = img_buffer.getvalue()
-
-                                mime_type = f"image/{img_format.lower()}"
-                                if img_format == 'JPEG':
-                                    mime_type = "image/jpeg"
-
-                                prompt = f"""Tu esi ekspertas akademinis asistentas.
-
-Išanalizuok šią nuotrauką (tai gali būti užrašai, lenta, skaidrė ar vadovėlis).
-Sukurk {num_cards_img} kortelių lietuvių kalba.
-
-GRĄŽINK TIK JSON ARRAY formatu:
-[
-  {{"klausimas": "...", "atsakymas": "..."}}
-]"""
-
-                                image_part = types.Part.from_bytes(
-                                    data=img_bytes,
-                                    mime_type=mime_type
-                                )
-
-                                response = client.models.generate_content(
-                                    model=GEMINI_MODEL,
-                                    contents=[prompt, image_part]
-                                )
-
-                                if not response.text:
-                                    st.warning(f"Nepavyko atpažinti nuotraukos {idx+1} turinio.")
-                                else:
-                                    cards = parse_flashcards_json(response.text)
-                                    if cards:
-                                        all_cards.extend(cards)
-                                    else:
-                                        st.warning(f"Nepavyko sukurti kortelių iš nuotraukos {idx+1}.")
-                            except Exception as e:
-                                if "timeout" in str(e).lower():
-                                    st.warning(f"Nuotrauka {idx+1} — užtruko per ilgai, praleista.")
-                                else:
-                                    st.warning(f"Nuotrauka {idx+1} — nepavyko apdoroti.")
-                    
-                    # Save all cards at once
-                    if all_cards:
-                        save_generated_cards(all_cards)
-                    else:
-                        st.error("Nepavyko sukurti kortelių iš nuotraukų. Pabandykite kitas.")
+                    images = [(f.getvalue(), f.type) for f in uploaded_images]
+                    submit_generation_job('photo', num_cards_img * len(images), photo_generation_job, images, num_cards_img, api_key)
 
 # ==================
 # TAB 2: MOKYMASIS
@@ -1383,21 +1912,26 @@ with tab2:
         # === SPACED REPETITION (original code) ===
         st.markdown("**Kartok protingai** — sistema parinks, kurias korteles laikas pakartoti")
 
-        today_cards = get_today_cards()
-        total_study_cards = len(st.session_state.study_cards)
+        due_queue = get_due_queue()
+        next_card_id = due_queue.peek()
+        total_study_cards = len(card_store().study_cards)
+        due_total = due_queue.due_count
+        server_due = st.session_state.get('server_due_count')
+        if st.session_state.get('card_loader') is not None and server_due is not None:
+            # Deck still streaming in: the server's count from the start of the load, minus grades since
+            due_total = max(due_total, server_due)
 
         col_stat1, col_stat2, col_stat3 = st.columns(3)
         with col_stat1:
             st.metric("Visos kortelės", total_study_cards)
         with col_stat2:
-            st.metric("Šiandien kartoti", len(today_cards))
+            st.metric("Šiandien kartoti", due_total)
         with col_stat3:
-            mastered = sum(1 for c in st.session_state.study_cards.values() if c.get('difficulty', 3) >= 4)
-            st.metric("Įsisavintos", mastered)
+            st.metric("Įsisavintos", due_queue.mastered_count)
 
         st.divider()
 
-        if not st.session_state.study_cards:
+        if not card_store().study_cards:
             st.info("Kol kas neturite kortelių. Sukurkite jas 'Naujos kortelės' skiltyje!")
 
             st.subheader("Kaip tai veikia?")
@@ -1407,19 +1941,19 @@ with tab2:
             3. **Atsakote neteisingai** — kortelė grįžta kartoti dažniau
             4. **Įsisavinote** — kortelė kartojama tik kas 2 savaites
             """)
-        elif not today_cards:
+        elif next_card_id is None:
             st.success("Puiku! Šiandien viskas pakartota. Grįžkite rytoj!")
 
             st.subheader("Jūsų progresas")
-            for card_id, card_data in list(st.session_state.study_cards.items())[:5]:
+            for card_data in itertools.islice(card_store().study_cards.values(), 5):
                 difficulty = card_data.get('difficulty', 3)
                 level = ["", "Naujas", "Pradžia", "Vidutinis", "Gerai moku", "Įsisavinta"][min(difficulty, 5)]
                 st.markdown(f"**{html.escape(card_data['question'][:50])}...** — {level}")
         else:
-            card_data = today_cards[0]
-            card_id = card_data['id']
+            card_id = next_card_id
+            card_data = card_store().study_cards[card_id]
 
-            st.subheader(f"Kortelė {1}/{len(today_cards)}")
+            st.subheader(f"Kortelė {1}/{due_total}")
 
             st.markdown(f"""
             <div class="study-card study-card-q">
@@ -1461,7 +1995,7 @@ with tab2:
     else:
         # === EGZAMINO REŽIMAS ===
 
-        if not st.session_state.flashcards:
+        if not card_store().flashcards:
             st.info("Norėdami pradėti egzaminą, pirmiausia susikurkite kortelių!")
 
         elif st.session_state.exam_finished:
@@ -1532,7 +2066,7 @@ with tab2:
 
         elif not st.session_state.exam_active:
             # ---- PRADŽIOS EKRANAS ----
-            total_available = len(st.session_state.flashcards)
+            total_available = len(card_store().flashcards)
             st.markdown(f"Turite **{total_available}** kortelių. Pasirinkite egzamino nustatymus:")
 
             exam_count = st.select_slider(
@@ -1559,7 +2093,7 @@ with tab2:
             """)
 
             if st.button("Pradėti egzaminą", type="primary", use_container_width=True, key="exam_start"):
-                all_cards = list(st.session_state.flashcards)
+                all_cards = list(card_store().flashcards)
                 random.shuffle(all_cards)
                 st.session_state.exam_cards = all_cards[:exam_count]
                 st.session_state.exam_total = exam_count
@@ -1655,10 +2189,10 @@ with tab2:
 with tab3:
     st.header("🎴 Jūsų kortelės")
 
-    if not st.session_state.flashcards:
+    if not card_store().flashcards:
         st.info("Kol kas neturite kortelių. Sukurkite jas 'Naujos kortelės' skiltyje!")
     else:
-        all_cards = st.session_state.flashcards
+        all_cards = card_store().flashcards
 
         # Search & filter
         search_col, count_col = st.columns([3, 1])
@@ -1770,104 +2304,125 @@ with tab3:
             st.divider()
             st.subheader("Redaguoti korteles")
 
-            for idx_in_filtered, real_idx in enumerate(filtered_indices):
+            # Only the visible page gets widgets; edits live in card_edits until saved
+            edits = st.session_state.card_edits
+            page_count = (total + EDITOR_PAGE_SIZE - 1) // EDITOR_PAGE_SIZE
+            page = min(st.session_state.editor_page, page_count - 1)
+            st.session_state.editor_page = page
+
+            if edits:
+                col_dirty, col_save_all, col_discard = st.columns([2, 1, 1])
+                with col_dirty:
+                    st.caption(f"Neišsaugotų pakeitimų: {len(edits)}")
+                with col_save_all:
+                    if st.button("💾 Išsaugoti visus", key="save_all_edits", use_container_width=True):
+                        save_card_edits()
+                        st.rerun()
+                with col_discard:
+                    if st.button("↩️ Atšaukti", key="discard_edits", use_container_width=True):
+                        for card_id in edits:
+                            st.session_state.pop(f"q_{card_id}", None)
+                            st.session_state.pop(f"a_{card_id}", None)
+                        edits.clear()
+                        st.rerun()
+
+            page_start = page * EDITOR_PAGE_SIZE
+            for real_idx in filtered_indices[page_start:page_start + EDITOR_PAGE_SIZE]:
                 c = all_cards[real_idx]
-                label = f"**{real_idx+1}. {html.escape(c['klausimas'][:50])}{'...' if len(c['klausimas']) > 50 else ''}**"
+                draft = edits.get(c.id)
+                marker = " ✏️" if draft else ""
+                label = f"**{real_idx+1}. {html.escape(c['klausimas'][:50])}{'...' if len(c['klausimas']) > 50 else ''}**{marker}"
                 with st.expander(label):
-                    new_q = st.text_input("Klausimas:", c['klausimas'], key=f"q_{real_idx}")
-                    new_a = st.text_area("Atsakymas:", c['atsakymas'], key=f"a_{real_idx}", height=100)
+                    st.text_input("Klausimas:", draft["klausimas"] if draft else c['klausimas'],
+                                  key=f"q_{c.id}", on_change=record_card_edit, args=(c.id,))
+                    st.text_area("Atsakymas:", draft["atsakymas"] if draft else c['atsakymas'],
+                                 key=f"a_{c.id}", height=100, on_change=record_card_edit, args=(c.id,))
 
-                    if st.button("💾 Išsaugoti", key=f"save_{real_idx}"):
-                        st.session_state.flashcards[real_idx] = {"klausimas": new_q, "atsakymas": new_a}
+                    if st.button("💾 Išsaugoti", key=f"save_{c.id}"):
+                        save_card_edits([c.id])
                         st.success("Išsaugota!")
 
+            if page_count > 1:
+                col_page1, col_page2, col_page3 = st.columns([1, 2, 1])
+                with col_page1:
+                    if st.button("⬅️", key="editor_prev", disabled=page == 0, use_container_width=True):
+                        st.session_state.editor_page -= 1
+                        st.rerun()
+                with col_page2:
+                    st.caption(f"Puslapis {page + 1} iš {page_count}")
+                with col_page3:
+                    if st.button("➡️", key="editor_next", disabled=page == page_count - 1, use_container_width=True):
+                        st.session_state.editor_page += 1
+                        st.rerun()
+
 # ==================
 # TAB 4: EKSPORTAS
 # ==================
 with tab4:
     st.header("💾 Atsisiųsti korteles")
 
-    if not st.session_state.flashcards:
+    if not card_store().flashcards:
         st.info("Kol kas neturite kortelių. Sukurkite jas ir galėsite atsisiųsti!")
     else:
-        st.success(f"Turite {len(st.session_state.flashcards)} kortelių — galite atsisiųsti bet kuriuo formatu")
+        st.success(f"Turite {len(card_store().flashcards)} kortelių — galite atsisiųsti bet kuriuo formatu")
 
+        # Exports are built when asked for and reused until the cards change
+        flashcards = card_store().flashcards
+        export_version = card_store().version
         col_dl1, col_dl2 = st.columns(2)
 
         with col_dl1:
-            st.download_button(
-                label="⬇️ Anki (CSV)",
-                data=export_to_anki_csv(st.session_state.flashcards),
-                file_name=f"flashcards_anki_{datetime.now().strftime('%Y%m%d')}.csv",
-                mime="text/csv",
-                use_container_width=True
-            )
-            st.download_button(
-                label="⬇️ Quizlet (JSON)",
-                data=export_to_quizlet_json(st.session_state.flashcards),
-                file_name=f"flashcards_quizlet_{datetime.now().strftime('%Y%m%d')}.json",
-                mime="application/json",
-                use_container_width=True
-            )
+            export_button("anki", flashcards, export_version)
+            export_button("quizlet", flashcards, export_version)
 
         with col_dl2:
-            st.download_button(
-                label="⬇️ Tekstas (TXT)",
-                data=export_to_txt(st.session_state.flashcards),
-                file_name=f"flashcards_{datetime.now().strftime('%Y%m%d')}.txt",
-                mime="text/plain",
-                use_container_width=True
-            )
-
-            html_table = """
-            <style>
-                @media print { .page-break { page-break-after: always; } }
-                table { width: 100%; border-collapse: collapse; margin-top: 20px; }
-                td, th { border: 1px solid #333; padding: 15px; }
-                th { background-color: #667eea; color: white; }
-            </style>
-            <h2>Mano Kortelės</h2>
-            <table>
-                <tr><th>Klausimas</th><th>Atsakymas</th></tr>
-            """
-            for c in st.session_state.flashcards:
-                html_table += f"<tr><td>{html.escape(c['klausimas'])}</td><td>{html.escape(c['atsakymas'])}</td></tr>"
-            html_table += "</table>"
-
-            st.download_button(
-                "⬇️ Spausdinimui (HTML)",
-                html_table,
-                "korteles_print.html",
-                "text/html",
-                use_container_width=True
-            )
+            export_button("txt", flashcards, export_version)
+            export_button("print", flashcards, export_version)
 
         st.divider()
         st.subheader("Peržiūra")
-        for i, card in enumerate(st.session_state.flashcards, 1):
+        total = len(flashcards)
+        page_count = (total + PREVIEW_PAGE_SIZE - 1) // PREVIEW_PAGE_SIZE
+        page = min(st.session_state.preview_page, page_count - 1)
+        st.session_state.preview_page = page
+        page_start = page * PREVIEW_PAGE_SIZE
+        for i, card in enumerate(flashcards[page_start:page_start + PREVIEW_PAGE_SIZE], page_start + 1):
             st.markdown(f"**{i}. {html.escape(card['klausimas'])}**")
             st.caption(f"↳ {html.escape(card['atsakymas'])}")
 
+        if page_count > 1:
+            col_prev1, col_prev2, col_prev3 = st.columns([1, 2, 1])
+            with col_prev1:
+                if st.button("⬅️", key="preview_prev", disabled=page == 0, use_container_width=True):
+                    st.session_state.preview_page -= 1
+                    st.rerun()
+            with col_prev2:
+                st.caption(f"Puslapis {page + 1} iš {page_count}")
+            with col_prev3:
+                if st.button("➡️", key="preview_next", disabled=page == page_count - 1, use_container_width=True):
+                    st.session_state.preview_page += 1
+                    st.rerun()
+
 # ==================
 # TAB 5: AI TUTOR CHAT
 # ==================
 with tab5:
     st.header("💬 Paklausk AI — paaiškinsiu!")
 
-    if not st.session_state.flashcards:
+    if not card_store().flashcards:
         st.info("Kol kas neturite kortelių. Sukurkite jas ir galėsite klausti AI apie bet kurią temą!")
     elif not api_key:
         st.warning("AI asistentas šiuo metu neprieinamas. Bandykite vėliau.")
     else:
         # Card selector
-        card_options = [f"{i+1}. {c['klausimas'][:50]}..." for i, c in enumerate(st.session_state.flashcards)]
+        card_options = [f"{i+1}. {c['klausimas'][:50]}..." for i, c in enumerate(card_store().flashcards)]
         selected_idx = st.selectbox(
             "Pasirinkite kortelę, apie kurią norite klausti:",
             range(len(card_options)),
             format_func=lambda x: card_options[x]
         )
         
-        selected_card = st.session_state.flashcards[selected_idx]
+        selected_card = card_store().flashcards[selected_idx]
         
         # Show selected card context
         st.markdown(f"""
@@ -1929,10 +2484,10 @@ TAISYKLĖS:
 
 ATSAKYMAS:"""
 
-                    response = client.models.generate_content(
+                    response = call_gemini(lambda: client.models.generate_content(
                         model=GEMINI_MODEL,
                         contents=prompt
-                    )
+                    ))
                     
                     ai_response = response.text.strip() if response.text else "Hmm, nepavyko parengti atsakymo. Pabandykite paklausti kitaip!"
                     
@@ -1941,7 +2496,7 @@ ATSAKYMAS:"""
                     
                 except Exception as e:
                     error_msg = "Nepavyko gauti atsakymo. Bandykite dar kartą."
-                    if "quota" in str(e).lower() or "429" in str(e):
+                    if isinstance(e, RateLimitTimeout) or "quota" in str(e).lower() or "429" in str(e):
                         error_msg = "Serveris šiuo metu užimtas. Palaukite minutę ir bandykite dar kartą."
                     st.error(error_msg)
         
@@ -2003,14 +2558,8 @@ with tab6:
                     downloads = pub_set.get('downloads_count', 0)
                     set_id = pub_set.get('id')
 
-                    # Author email (partial, for privacy)
-                    author_info = pub_set.get('profiles', {})
-                    author_email = author_info.get('email', '') if isinstance(author_info, dict) else ''
-                    if author_email:
-                        parts = author_email.split('@')
-                        author_display = f"{parts[0][:3]}***@{parts[1]}" if len(parts) == 2 else ''
-                    else:
-                        author_display = ''
+                    # Author email, masked by search_public_sets (partial, for privacy)
+                    author_display = pub_set.get('author') or ''
 
                     # Card label
                     label_parts = [f"**{html.escape(set_name)}**"]
@@ -2068,7 +2617,7 @@ with tab6:
                 user_sets = user_sets_result['sets']
 
                 set_options = [
-                    f"{s['name']} ({s.get('card_count', '?')} kort.) {'✅ Viešas' if s.get('is_public') else ''}"
+                    f"{s['name']} ({s.get('card_count', '?')} kort.{', ' + str(s['due_count']) + ' kartoti' if s.get('due_count') else ''}) {'✅ Viešas' if s.get('is_public') else ''}"
                     for s in user_sets
                 ]
 
@@ -0,0 +1,150 @@
+# Incremental flashcard JSON parser for QUANTUM
+import json
+import re
+
+# Accepted key spellings (compared lower-cased and stripped)
+QUESTION_KEYS = ('klausimas', 'question', 'q', 'front', 'term')
+ANSWER_KEYS = ('atsakymas', 'answer', 'a', 'back', 'definition')
+
+_TRAILING_COMMA_RE = re.compile(r',\s*([}\]])')
+
+
+def normalize_card(obj):
+    """Map alternate key spellings to {'klausimas', 'atsakymas'}; None if obj is not a card"""
+    if not isinstance(obj, dict):
+        return None
+    fields = {str(k).strip().lower(): v for k, v in obj.items()}
+    question = next((fields[k] for k in QUESTION_KEYS if k in fields), None)
+    answer = next((fields[k] for k in ANSWER_KEYS if k in fields), None)
+    if question is None or answer is None or isinstance(question, (dict, list)) or isinstance(answer, (dict, list)):
+        return None
+    question, answer = str(question).strip(), str(answer).strip()
+    if not question or not answer:
+        return None
+    return {'klausimas': question, 'atsakymas': answer}
+
+
+def _decode_object(raw):
+    """json.loads with light repairs for common model mistakes"""
+    try:
+        return json.loads(raw, strict=False)  # strict=False: raw newlines inside strings
+    except json.JSONDecodeError:
+        pass
+    try:
+        return json.loads(_TRAILING_COMMA_RE.sub(r'\1', raw), strict=False)
+    except json.JSONDecodeError:
+        return None
+
+
+_SPECIAL_RE = re.compile(r'[{}"\\]')
+_STRING_SPECIAL_RE = re.compile(r'["\\]')
+
+
+class IncrementalCardParser:
+    """Feed model output piece by piece; get back each card object as soon as it closes.
+
+    One pass over the characters: only the current top-level {...} is kept
+    between feeds, so markdown fences, the surrounding [ ] and any chatter
+    around the JSON are skipped for free and a truncated tail costs nothing
+    but the unfinished card. Wrappers such as {"cards": [...]} are handled by
+    emitting the inner objects.
+    """
+
+    def __init__(self):
+        self._pending = ""       # Unfinished top-level object carried between feeds
+        self._scan_pos = 0       # Where scanning resumes inside _pending
+        self._in_string = False
+        self._starts = []        # Offset of every open '{'
+        self._has_card = []      # Whether a nested card was already emitted per open '{'
+        self.cards_found = 0
+        self.objects_skipped = 0
+
+    def feed(self, text):
+        """Consume the next piece of output and return the cards completed by it"""
+        cards = []
+        data = self._pending + text
+        pos = self._scan_pos
+        starts = self._starts
+        end = len(data)
+
+        while pos < end:
+            if not starts:
+                i = data.find('{', pos)
+                if i < 0:
+                    pos = end
+                    break
+                starts.append(i)
+                self._has_card.append(False)
+                pos = i + 1
+            elif self._in_string:
+                m = _STRING_SPECIAL_RE.search(data, pos)
+                if not m:
+                    pos = end
+                    break
+                if m.group() == '\\':
+                    pos = m.start() + 2  # Skip the escaped character (may be in the next feed)
+                else:
+                    self._in_string = False
+                    pos = m.end()
+            else:
+                m = _SPECIAL_RE.search(data, pos)
+                if not m:
+                    pos = end
+                    break
+                ch = m.group()
+                pos = m.end()
+                if ch == '"':
+                    self._in_string = True
+                elif ch == '{':
+                    starts.append(m.start())
+                    self._has_card.append(False)
+                elif ch == '}':
+                    card = self._close_object(data, m.end())
+                    if card:
+                        cards.append(card)
+
+        if starts:
+            # Keep text from the outermost object that may still be decoded; open
+            # wrappers are never decoded, so a long {"cards": [...]} is not carried along
+            base = next((s for s, wrapper in zip(starts, self._has_card) if not wrapper), min(pos, end))
+            self._pending = data[base:]
+            self._starts = [s - base for s in starts]
+            self._scan_pos = pos - base
+        else:
+            self._pending = ""
+            self._scan_pos = 0
+        self.cards_found += len(cards)
+        return cards
+
+    def _close_object(self, data, end):
+        """Decode the object that just closed; None if it is not a card"""
+        start = self._starts.pop()
+        wrapper = self._has_card.pop()
+        if wrapper:
+            return None  # Its cards were already emitted one by one
+        card = normalize_card(_decode_object(data[start:end]))
+        if card is None:
+            self.objects_skipped += 1
+        else:
+            self._has_card = [True] * len(self._has_card)  # Every enclosing object is a wrapper
+        return card
+
+    def finish(self):
+        """Discard any unfinished object (truncated output) and reset"""
+        self._pending = ""
+        self._scan_pos = 0
+        self._in_string = False
+        self._starts = []
+        self._has_card = []
+
+
+def parse_cards(content):
+    """Parse every complete card from a full (possibly fenced or truncated) response"""
+    return IncrementalCardParser().feed(content or "")
+
+
+def iter_cards(chunks):
+    """Yield cards from an iterable of text chunks (e.g. a Gemini stream)"""
+    parser = IncrementalCardParser()
+    for chunk in chunks:
+        yield from parser.feed(chunk or "")
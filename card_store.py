@@ -0,0 +1,160 @@
+# Compact per-session card store for QUANTUM
+# One slotted record per card holds the only copy of its texts and a numeric
+# next_review. The "flashcards" list and the "study_cards" mapping the UI works
+# with are views over the same records, so a deck is not held twice per session.
+from datetime import datetime
+
+_ALIASES = {"klausimas": "question", "atsakymas": "answer"}
+
+
+def _to_timestamp(value) -> float:
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        return datetime.fromisoformat(str(value)).timestamp()
+    except ValueError:
+        return datetime.now().timestamp()
+
+
+class Card:
+    """One card. Readable like the old dicts: card['klausimas'], card.get('next_review'), ..."""
+
+    __slots__ = ("id", "set_id", "question", "answer", "difficulty", "next_review_ts", "times_reviewed")
+
+    def __init__(self, card_id, question, answer, set_id=None, difficulty=3, next_review=None, times_reviewed=0):
+        self.id = card_id
+        self.set_id = set_id
+        self.question = question
+        self.answer = answer
+        self.difficulty = difficulty
+        self.next_review_ts = _to_timestamp(next_review) if next_review is not None else datetime.now().timestamp()
+        self.times_reviewed = times_reviewed
+
+    @classmethod
+    def from_dict(cls, card_id, data):
+        """From a loaded ({'klausimas', 'atsakymas', ...}) or study ({'question', 'answer', ...}) dict"""
+        return cls(
+            card_id,
+            data.get("klausimas", data.get("question", "")),
+            data.get("atsakymas", data.get("answer", "")),
+            set_id=data.get("set_id"),
+            difficulty=data.get("difficulty", 3),
+            next_review=data.get("next_review"),
+            times_reviewed=data.get("times_reviewed", 0)
+        )
+
+    @property
+    def next_review(self) -> str:
+        return datetime.fromtimestamp(self.next_review_ts).isoformat()
+
+    def __getitem__(self, key):
+        if key == "next_review":
+            return self.next_review
+        attr = _ALIASES.get(key, key)
+        if attr not in self.__slots__:
+            raise KeyError(key)
+        return getattr(self, attr)
+
+    def __setitem__(self, key, value):
+        if key == "next_review":
+            self.next_review_ts = _to_timestamp(value)
+            return
+        attr = _ALIASES.get(key, key)
+        if attr not in self.__slots__:
+            raise KeyError(key)
+        setattr(self, attr, value)
+
+    def __contains__(self, key):
+        return key == "next_review" or _ALIASES.get(key, key) in self.__slots__
+
+    def get(self, key, default=None):
+        try:
+            value = self[key]
+        except KeyError:
+            return default
+        return default if value is None else value
+
+    def to_dict(self):
+        """Plain flashcard dict (for JSON and anything that needs a real dict)"""
+        return {
+            "id": self.id,
+            "set_id": self.set_id,
+            "klausimas": self.question,
+            "atsakymas": self.answer,
+            "difficulty": self.difficulty,
+            "next_review": self.next_review,
+            "times_reviewed": self.times_reviewed,
+        }
+
+
+class CardStore:
+    """All cards of a session by id, plus the ordered subset currently shown.
+
+    study_cards -> {card_id: Card} (the whole deck, for spaced repetition)
+    flashcards  -> [Card, ...]     (the set being browsed: the deck after a sync,
+                                    or just the cards generated last)
+    version     -> int             (bumped on every change, so derived data such as
+                                    exports can be cached without hashing the deck)
+    """
+
+    def __init__(self):
+        self.study_cards = {}
+        self._flashcards = []
+        self._set_ids = {}          # One string per set id, shared by all of its cards
+        self.version = 0
+
+    def __len__(self):
+        return len(self.study_cards)
+
+    @property
+    def flashcards(self):
+        return self._flashcards
+
+    @flashcards.setter
+    def flashcards(self, cards):
+        self._flashcards = cards
+        self.version += 1
+
+    def mark_changed(self):
+        """Record an edit made directly on a card's fields"""
+        self.version += 1
+
+    def put(self, card_id, data):
+        """Insert a card or update it in place from a dict; returns the record"""
+        card = self.study_cards.get(card_id)
+        if card is None:
+            card = self.study_cards[card_id] = Card.from_dict(card_id, data)
+        else:
+            for key in ("klausimas", "atsakymas", "question", "answer", "set_id",
+                        "difficulty", "next_review", "times_reviewed"):
+                if key in data and data[key] is not None:
+                    card[key] = data[key]
+        if card.set_id is not None:
+            card.set_id = self._set_ids.setdefault(card.set_id, card.set_id)
+        self.version += 1
+        return card
+
+    def replace(self, cards):
+        """Replace the whole deck with loaded card dicts (all of them become the browsed set)"""
+        self.study_cards = {}
+        self._set_ids = {}
+        self.flashcards = [self.put(c["id"], c) for c in cards if c.get("id")]
+
+    def append(self, cards):
+        """Add loaded card dicts to the deck and the browsed set"""
+        for c in cards:
+            if c["id"] not in self.study_cards:
+                self._flashcards.append(self.put(c["id"], c))
+
+    def remove(self, card_ids):
+        card_ids = set(card_ids)
+        if not card_ids:
+            return
+        for card_id in card_ids:
+            self.study_cards.pop(card_id, None)
+        self.flashcards = [c for c in self.flashcards if c.id not in card_ids]
+
+    def clear(self):
+        self.study_cards = {}
+        self.flashcards = []
+        self._set_ids = {}
@@ -0,0 +1,187 @@
+# Near-duplicate card index for QUANTUM
+# MinHash signatures over character shingles of each question, bucketed with
+# LSH banding, so "is this card already in the deck?" only compares against a
+# handful of candidates instead of every card. A candidate counts as a duplicate
+# only if its answer matches too: questions like "first/second law of ..." are
+# near-identical as text but are different cards.
+import re
+import threading
+import zlib
+from array import array
+from collections import OrderedDict
+
+SHINGLE_SIZE = 5
+NUM_PERM = 32
+BANDS = 8                   # 8 bands x 4 rows: ~89% recall at 0.7 similarity, ~98% at 0.8
+MAX_CANDIDATES = 64         # Cap on signature comparisons per lookup
+ROWS = NUM_PERM // BANDS
+DUPLICATE_THRESHOLD = 0.7   # Estimated Jaccard similarity (question and answer) treated as duplicate
+MAX_USERS = 500             # Per-user indexes kept in memory
+
+_MASK = (1 << 32) - 1
+_GOLDEN = 0x9E3779B1        # Multiplicative mixing constant for crc32 values
+_EMPTY = _MASK
+_BIN_BITS = NUM_PERM.bit_length() - 1
+
+_NON_WORD_RE = re.compile(r'[\W_]+')
+
+
+def normalize_question(text: str) -> str:
+    """Lowercase, drop punctuation, collapse whitespace"""
+    return _NON_WORD_RE.sub(' ', (text or '').lower()).strip()
+
+
+def minhash(norm: str) -> array:
+    """32-value one-permutation MinHash signature of a normalized text.
+
+    Each shingle is hashed once and routed to one of NUM_PERM bins (the
+    minimum per bin is kept), so the cost is O(shingles) rather than
+    O(shingles x permutations). Empty bins borrow from the next filled bin.
+    """
+    data = norm.encode('utf-8')
+    sig = [_EMPTY] * NUM_PERM
+    for i in range(max(1, len(data) - SHINGLE_SIZE + 1)):
+        h = (zlib.crc32(data[i:i + SHINGLE_SIZE]) * _GOLDEN) & _MASK
+        slot = h & (NUM_PERM - 1)
+        value = h >> _BIN_BITS
+        if value < sig[slot]:
+            sig[slot] = value
+
+    # Rotation densification keeps empty bins comparable between signatures
+    if _EMPTY in sig:
+        filled = [i for i, v in enumerate(sig) if v != _EMPTY]
+        if filled:
+            for i in range(NUM_PERM):
+                if sig[i] == _EMPTY:
+                    distance = next(d for d in range(1, NUM_PERM + 1) if sig[(i + d) % NUM_PERM] != _EMPTY)
+                    sig[i] = (sig[(i + distance) % NUM_PERM] + distance * _GOLDEN) & _MASK
+    return array('I', sig)
+
+
+def similarity(sig_a, sig_b) -> float:
+    """Estimated Jaccard similarity from two signatures"""
+    return sum(1 for x, y in zip(sig_a, sig_b) if x == y) / NUM_PERM
+
+
+class NearDuplicateIndex:
+    """Incrementally maintained LSH index over one user's cards (banded on the question)"""
+
+    def __init__(self, threshold=DUPLICATE_THRESHOLD):
+        self.threshold = threshold
+        self._signatures = {}                       # card_id -> question signature
+        self._answers = {}                          # card_id -> answer signature
+        self._exact = {}                            # (question, answer) normalized -> card_id
+        self._norms = {}                            # card_id -> (question, answer) normalized
+        self._buckets = [dict() for _ in range(BANDS)]
+        self._lock = threading.Lock()
+        self.ready = False                          # True once built from the full deck
+
+    def __len__(self):
+        return len(self._signatures)
+
+    def _bands(self, sig):
+        return [tuple(sig[i * ROWS:(i + 1) * ROWS]) for i in range(BANDS)]
+
+    def _add_signature(self, card_id, norm, sig, answer_sig):
+        if card_id in self._signatures:
+            return
+        self._signatures[card_id] = sig
+        self._answers[card_id] = answer_sig
+        self._norms[card_id] = norm
+        self._exact.setdefault(norm, card_id)
+        for band, key in zip(self._buckets, self._bands(sig)):
+            band.setdefault(key, []).append(card_id)
+
+    def add(self, card_id, question, answer=""):
+        """Index one card (idempotent per card_id)"""
+        norm = normalize_question(question)
+        if not norm:
+            return
+        answer_norm = normalize_question(answer)
+        sig, answer_sig = minhash(norm), minhash(answer_norm)
+        with self._lock:
+            self._add_signature(str(card_id), (norm, answer_norm), sig, answer_sig)
+
+    def remove(self, card_id):
+        """Drop one card from the index (no-op if it is not indexed)"""
+        card_id = str(card_id)
+        with self._lock:
+            sig = self._signatures.pop(card_id, None)
+            if sig is None:
+                return
+            self._answers.pop(card_id)
+            norm = self._norms.pop(card_id)
+            if self._exact.get(norm) == card_id:
+                del self._exact[norm]
+            for band, key in zip(self._buckets, self._bands(sig)):
+                ids = band.get(key)
+                if ids and card_id in ids:
+                    ids.remove(card_id)
+                    if not ids:
+                        del band[key]
+
+    def rebuild(self, cards):
+        """Replace the index with a full deck of cards (dicts or card store records with 'id', 'klausimas', 'atsakymas')"""
+        with self._lock:
+            self._signatures.clear()
+            self._answers.clear()
+            self._exact.clear()
+            self._norms.clear()
+            self._buckets = [dict() for _ in range(BANDS)]
+        for card in cards:
+            if card.get('id'):
+                self.add(card['id'], card.get('klausimas', ''), card.get('atsakymas', ''))
+        self.ready = True
+
+    def _match(self, norm, sig, answer_sig):
+        exact = self._exact.get(norm)
+        if exact is not None:
+            return exact
+        checked = set()
+        for band, key in zip(self._buckets, self._bands(sig)):
+            for card_id in band.get(key, ()):
+                if card_id in checked:
+                    continue
+                if len(checked) >= MAX_CANDIDATES:
+                    return None
+                checked.add(card_id)
+                if (similarity(sig, self._signatures[card_id]) >= self.threshold
+                        and similarity(answer_sig, self._answers[card_id]) >= self.threshold):
+                    return card_id
+        return None
+
+    def split_new(self, cards):
+        """Split cards into (new, duplicates) against the index and within the batch itself"""
+        new, duplicates = [], []
+        batch = NearDuplicateIndex(self.threshold)
+        for i, card in enumerate(cards):
+            question = normalize_question(card.get('klausimas', ''))
+            norm = (question, normalize_question(card.get('atsakymas', '')))
+            sig, answer_sig = (minhash(norm[0]), minhash(norm[1])) if question else (None, None)
+            with self._lock:
+                hit = self._match(norm, sig, answer_sig) if question else None
+            if hit is None and question:
+                hit = batch._match(norm, sig, answer_sig)
+            if hit is not None:
+                duplicates.append(card)
+            else:
+                new.append(card)
+                if question:
+                    batch._add_signature(f"batch_{i}", norm, sig, answer_sig)
+        return new, duplicates
+
+
+_indexes = OrderedDict()
+_indexes_lock = threading.Lock()
+
+
+def get_user_index(user_id: str) -> NearDuplicateIndex:
+    """Get (or create) the process-wide index for one user"""
+    with _indexes_lock:
+        index = _indexes.get(user_id)
+        if index is None:
+            index = _indexes[user_id] = NearDuplicateIndex()
+        _indexes.move_to_end(user_id)
+        while len(_indexes) > MAX_USERS:
+            _indexes.popitem(last=False)
+        return index
@@ -0,0 +1,121 @@
+# Due queue for QUANTUM's spaced repetition
+# Kept in session state next to the card store and updated on every change, so the
+# study tab reads the next card and its counters without scanning the deck.
+import heapq
+from datetime import datetime, date, time, timedelta
+
+MASTERED_DIFFICULTY = 4
+
+
+def review_timestamp(next_review) -> float:
+    """ISO next_review string (or POSIX seconds) -> POSIX seconds (naive strings are local time)"""
+    if isinstance(next_review, (int, float)):
+        return float(next_review)
+    try:
+        return datetime.fromisoformat(str(next_review)).timestamp()
+    except ValueError:
+        return 0.0  # Unparseable dates count as due, like a brand-new card
+
+
+def _end_of_today() -> float:
+    return datetime.combine(date.today() + timedelta(days=1), time.min).timestamp()
+
+
+class DueQueue:
+    """Two heaps ordered by next_review: cards due by the end of today, and the rest.
+
+    Updates are O(log n); superseded heap entries are skipped lazily and the heaps
+    are compacted once they are mostly stale. Counters for due and mastered cards
+    are kept as cards change, so reading them is O(1).
+    """
+
+    def __init__(self):
+        self._entries = {}          # card_id -> (timestamp, seq, difficulty, is_due)
+        self._due = []              # (timestamp, seq, card_id)
+        self._future = []
+        self._seq = 0
+        self._boundary = _end_of_today()
+        self.due_count = 0
+        self.mastered_count = 0
+
+    @classmethod
+    def from_cards(cls, cards):
+        """Build from card store records (card_store.Card) in O(n)"""
+        queue = cls()
+        for card in cards:
+            queue._set(card.id, card.next_review_ts, card.difficulty or 3, list.append)
+        heapq.heapify(queue._due)
+        heapq.heapify(queue._future)
+        return queue
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, card_id):
+        return card_id in self._entries
+
+    def is_due(self, card_id):
+        """True if the card is in the queue and due by the end of today"""
+        entry = self._entries.get(card_id)
+        return entry is not None and entry[3]
+
+    def _set(self, card_id, timestamp, difficulty, add=heapq.heappush):
+        """Record a card's state and add its heap entry"""
+        self._forget(card_id)
+        self._seq += 1
+        is_due = timestamp < self._boundary
+        self._entries[card_id] = (timestamp, self._seq, difficulty, is_due)
+        add(self._due if is_due else self._future, (timestamp, self._seq, card_id))
+        if is_due:
+            self.due_count += 1
+        if difficulty >= MASTERED_DIFFICULTY:
+            self.mastered_count += 1
+
+    def _forget(self, card_id):
+        old = self._entries.pop(card_id, None)
+        if old is None:
+            return
+        if old[3]:
+            self.due_count -= 1
+        if old[2] >= MASTERED_DIFFICULTY:
+            self.mastered_count -= 1
+
+    def _is_live(self, item):
+        entry = self._entries.get(item[2])
+        return entry is not None and entry[1] == item[1]
+
+    def update(self, card_id, next_review, difficulty=3):
+        """Insert or reschedule one card"""
+        self._set(card_id, review_timestamp(next_review), difficulty)
+        self._maybe_compact()
+
+    def remove(self, card_id):
+        self._forget(card_id)
+        self._maybe_compact()
+
+    def refresh(self):
+        """Move cards that became due since the day changed (no-op within the same day)"""
+        boundary = _end_of_today()
+        if boundary == self._boundary:
+            return
+        self._boundary = boundary
+        while self._future and self._future[0][0] < boundary:
+            item = heapq.heappop(self._future)
+            if self._is_live(item):
+                timestamp, seq, difficulty, _ = self._entries[item[2]]
+                self._entries[item[2]] = (timestamp, seq, difficulty, True)
+                self.due_count += 1
+                heapq.heappush(self._due, item)
+
+    def peek(self):
+        """Id of the most overdue card due today, or None"""
+        while self._due and not self._is_live(self._due[0]):
+            heapq.heappop(self._due)
+        return self._due[0][2] if self._due else None
+
+    def _maybe_compact(self):
+        if len(self._due) + len(self._future) > 2 * len(self._entries) + 64:
+            self._due = [item for item in self._due if self._is_live(item)]
+            self._future = [item for item in self._future if self._is_live(item)]
+            heapq.heapify(self._due)
+            heapq.heapify(self._future)
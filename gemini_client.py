@@ -0,0 +1,73 @@
+# Shared Gemini clients for QUANTUM
+# One genai.Client per API key for the whole process, so every session, photo
+# worker and tutor message reuses the same keep-alive HTTP connection pool.
+import threading
+
+import httpx
+from google import genai
+from google.genai import types
+
+import metrics
+
+GEMINI_TIMEOUT_MS = 30_000
+MAX_CONNECTIONS = 20
+MAX_KEEPALIVE_CONNECTIONS = 10
+KEEPALIVE_EXPIRY_S = 60
+
+_clients = {}
+_lock = threading.Lock()
+
+
+def _trace(event_name, info):
+    """httpcore trace callback: count real TCP connects"""
+    if event_name == "connection.connect_tcp.complete":
+        metrics.incr("gemini_connections_opened")
+
+
+def _on_request(request):
+    """httpx request hook: count requests and attach the connection tracer"""
+    metrics.incr("gemini_requests")
+    request.extensions["trace"] = _trace
+
+
+def _http_options():
+    """Timeout plus a bounded keep-alive pool shared by all threads"""
+    client_args = {
+        "limits": httpx.Limits(
+            max_connections=MAX_CONNECTIONS,
+            max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=KEEPALIVE_EXPIRY_S
+        ),
+        "event_hooks": {"request": [_on_request]},
+    }
+    try:
+        return types.HttpOptions(timeout=GEMINI_TIMEOUT_MS, client_args=client_args)
+    except (TypeError, ValueError):
+        # Older google-genai without client_args: the client still keeps its own pool
+        return types.HttpOptions(timeout=GEMINI_TIMEOUT_MS)
+
+
+def get_client(api_key: str) -> genai.Client:
+    """Get the process-wide Gemini client for this API key (thread-safe)"""
+    client = _clients.get(api_key)
+    if client is not None:
+        return client
+    with _lock:
+        client = _clients.get(api_key)
+        if client is None:
+            client = genai.Client(api_key=api_key, http_options=_http_options())
+            _clients[api_key] = client
+            metrics.incr("gemini_clients_created")
+    return client
+
+
+def connection_stats():
+    """Connections opened vs requests served since process start"""
+    opened = metrics.counter("gemini_connections_opened")
+    requests = metrics.counter("gemini_requests")
+    return {
+        "clients": len(_clients),
+        "connections_opened": opened,
+        "requests": requests,
+        "reuse_ratio": (1 - opened / requests) if requests else 0.0,
+    }
@@ -0,0 +1,324 @@
+# Generation cache for QUANTUM
+# Process-wide: Streamlit imports this module once, so every session shares it.
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+import unicodedata
+from collections import OrderedDict
+
+CACHE_MEMORY_ENTRIES = int(os.getenv("GENERATION_CACHE_ENTRIES", "256"))
+CACHE_DISK_MAX_BYTES = int(os.getenv("GENERATION_CACHE_DISK_BYTES", str(50 * 1024 * 1024)))
+CACHE_DIR = os.getenv(
+    "GENERATION_CACHE_DIR",
+    os.path.join(tempfile.gettempdir(), "quantum_generation_cache")
+)
+
+
+def normalize_text(text: str) -> str:
+    """Normalize text so trivially different copies share a cache key"""
+    text = unicodedata.normalize("NFC", text or "")
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def make_cache_key(text: str, num_cards: int, language: str, model: str, prompt_version) -> str:
+    """Content-addressed key: sha256 of normalized text + generation params"""
+    payload = json.dumps(
+        [normalize_text(text), int(num_cards), language, model, str(prompt_version)],
+        ensure_ascii=False
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class _InFlight:
+    """One pending computation that concurrent callers wait on"""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.cond = threading.Condition()
+        self.cards = []             # Cards a streaming leader has produced so far
+        self.result = None
+        self.error = None
+
+    def publish(self, card):
+        with self.cond:
+            self.cards.append(card)
+            self.cond.notify_all()
+
+    def finish(self, result=None, error=None):
+        with self.cond:
+            self.result = result
+            self.error = error
+            self.event.set()
+            self.cond.notify_all()
+
+    def replay(self):
+        """Yield the leader's cards as they arrive, then raise its error if it failed"""
+        sent = 0
+        while True:
+            with self.cond:
+                while sent == len(self.cards) and not self.event.is_set():
+                    self.cond.wait()
+                batch = self.cards[sent:]
+                done = self.event.is_set()
+            sent += len(batch)
+            yield from batch
+            if done:
+                break
+        if self.error is not None:
+            raise self.error
+        yield from (self.result or [])[sent:]  # Leader was get_or_compute: nothing streamed
+
+
+class GenerationCache:
+    """Two-tier (memory LRU + size-bounded disk) cache with single-flight"""
+
+    def __init__(self, max_entries=CACHE_MEMORY_ENTRIES, disk_dir=CACHE_DIR,
+                 max_disk_bytes=CACHE_DISK_MAX_BYTES):
+        self.max_entries = max_entries
+        self.disk_dir = disk_dir
+        self.max_disk_bytes = max_disk_bytes
+        self._memory = OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._disk_lock = threading.Lock()
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "coalesced": 0, "errors": 0}
+        self._disk_bytes = 0
+
+        if self.disk_dir:
+            try:
+                os.makedirs(self.disk_dir, exist_ok=True)
+                self._disk_bytes = sum(size for _, size, _ in self._disk_entries())
+            except OSError:
+                self.disk_dir = None  # Read-only FS — memory tier only
+
+    # ---- memory tier ----
+
+    def _memory_get(self, key):
+        if key in self._memory:
+            self._memory.move_to_end(key)
+            return self._memory[key]
+        return None
+
+    def _memory_put(self, key, cards):
+        self._memory[key] = cards
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    # ---- disk tier ----
+
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, f"{key}.json")
+
+    def _disk_entries(self):
+        """List (path, size, mtime) of cache files"""
+        entries = []
+        for name in os.listdir(self.disk_dir):
+            if not name.endswith(".json"):
+                continue
+            path = os.path.join(self.disk_dir, name)
+            try:
+                st_info = os.stat(path)
+                entries.append((path, st_info.st_size, st_info.st_mtime))
+            except OSError:
+                continue
+        return entries
+
+    def _disk_get(self, key):
+        if not self.disk_dir:
+            return None
+        path = self._disk_path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                cards = json.load(f)
+            os.utime(path)  # Touch so eviction is least-recently-used
+            return cards if isinstance(cards, list) else None
+        except (OSError, ValueError):
+            return None
+
+    def _disk_put(self, key, cards):
+        if not self.disk_dir:
+            return
+        data = json.dumps(cards, ensure_ascii=False).encode("utf-8")
+        if len(data) > self.max_disk_bytes:
+            return
+        path = self._disk_path(key)
+        with self._disk_lock:
+            try:
+                old_size = os.path.getsize(path) if os.path.exists(path) else 0
+                tmp_path = f"{path}.{threading.get_ident()}.tmp"
+                with open(tmp_path, "wb") as f:
+                    f.write(data)
+                os.replace(tmp_path, path)  # Atomic: readers never see half a file
+                self._disk_bytes += len(data) - old_size
+                if self._disk_bytes > self.max_disk_bytes:
+                    self._evict_disk()
+            except OSError:
+                pass
+
+    def _evict_disk(self):
+        """Drop oldest files until the disk tier fits its budget (caller holds _disk_lock)"""
+        entries = sorted(self._disk_entries(), key=lambda e: e[2])
+        total = sum(size for _, size, _ in entries)
+        target = int(self.max_disk_bytes * 0.9)
+        for path, size, _ in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                continue
+        self._disk_bytes = total
+
+    # ---- public API ----
+
+    def get(self, key):
+        """Return cached cards or None"""
+        with self._lock:
+            cards = self._memory_get(key)
+            if cards is not None:
+                self._stats["memory_hits"] += 1
+                return list(cards)
+        cards = self._disk_get(key)
+        if cards is not None:
+            with self._lock:
+                self._stats["disk_hits"] += 1
+                self._memory_put(key, cards)
+            return list(cards)
+        return None
+
+    def put(self, key, cards):
+        """Store cards in both tiers (empty results are not cached)"""
+        if not cards:
+            return
+        cards = list(cards)
+        with self._lock:
+            self._memory_put(key, cards)
+        self._disk_put(key, cards)
+
+    def _join(self, key):
+        """Register as the leader for key, or join the computation already in flight.
+        Returns (pending, leader, cards); cards is set if a leader settled since the caller's miss."""
+        with self._lock:
+            cards = self._memory_get(key)
+            if cards is not None:
+                self._stats["memory_hits"] += 1
+                return None, False, list(cards)
+            pending = self._inflight.get(key)
+            if pending is None:
+                pending = _InFlight()
+                self._inflight[key] = pending
+                self._stats["misses"] += 1
+                return pending, True, None
+            self._stats["coalesced"] += 1
+            return pending, False, None
+
+    def _settle(self, key, pending, result=None, error=None, expected=None):
+        """Leader is done: cache the result and wake every follower.
+        A result with fewer than `expected` cards (e.g. cut off at the token limit) is not cached."""
+        if error is None and (expected is None or len(result or []) >= expected):
+            self.put(key, result)
+        with self._lock:
+            self._inflight.pop(key, None)
+            if error is not None:
+                self._stats["errors"] += 1
+        pending.finish(result, error)
+
+    def get_or_compute(self, key, compute, expected=None):
+        """Return cached cards, or run compute() once for all concurrent callers with this key
+        (cached only if it returned at least `expected` cards)"""
+        cards = self.get(key)
+        if cards is not None:
+            return cards
+
+        pending, leader, cards = self._join(key)
+        if cards is not None:
+            return cards
+        if not leader:
+            pending.event.wait()
+            if pending.error is not None:
+                raise pending.error
+            return list(pending.result or [])
+
+        try:
+            result = compute()
+        except Exception as e:
+            self._settle(key, pending, error=e)
+            raise
+        except BaseException:
+            self._settle(key, pending, error=RuntimeError("generation interrupted"))
+            raise
+        self._settle(key, pending, result, expected=expected)
+        return list(result or [])
+
+    def stream_or_compute(self, key, produce, expected=None):
+        """Generator version of get_or_compute: yield cards as produce() yields them.
+        Concurrent callers with the same key replay the leader's cards instead of producing their own."""
+        cards = self.get(key)
+        if cards is not None:
+            yield from cards
+            return
+
+        pending, leader, cards = self._join(key)
+        if cards is not None:
+            yield from cards
+            return
+        if not leader:
+            yield from pending.replay()
+            return
+
+        try:
+            for card in produce():
+                pending.publish(card)
+                yield card
+        except Exception as e:
+            self._settle(key, pending, error=e)
+            raise
+        except BaseException:
+            # Consumer stopped early (GeneratorExit): followers get the partial cards and an error
+            self._settle(key, pending, error=RuntimeError("generation stream abandoned"))
+            raise
+        self._settle(key, pending, list(pending.cards), expected=expected)
+
+    def stats(self):
+        """Hit/miss counters for the admin panel"""
+        with self._lock:
+            data = dict(self._stats)
+            data["memory_entries"] = len(self._memory)
+            data["inflight"] = len(self._inflight)
+        data["disk_bytes"] = self._disk_bytes
+        hits = data["memory_hits"] + data["disk_hits"] + data["coalesced"]
+        lookups = hits + data["misses"]
+        data["hit_rate"] = hits / lookups if lookups else 0.0
+        return data
+
+    def clear(self):
+        """Drop every cached entry (both tiers)"""
+        with self._lock:
+            self._memory.clear()
+        if self.disk_dir:
+            with self._disk_lock:
+                for path, _, _ in self._disk_entries():
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+                self._disk_bytes = 0
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_generation_cache() -> GenerationCache:
+    """Get the process-wide generation cache"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = GenerationCache()
+    return _cache
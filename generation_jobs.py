@@ -0,0 +1,263 @@
+# Background generation jobs for QUANTUM
+# Gemini calls run on a process-wide worker pool instead of the Streamlit script
+# thread. Jobs are tracked by id in a small SQLite store keyed by owner (user id),
+# so a tab switch, browser refresh or reconnect can still pick up the result.
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+from rate_limiter import GEMINI_BURST, GEMINI_RPM
+
+# A streamed generation holds its worker for tens of seconds but takes one limiter
+# token, so the pool is sized to keep the limiter busy; only work beyond that queues.
+TYPICAL_JOB_S = 30
+JOB_WORKERS = int(os.getenv("GENERATION_JOB_WORKERS", "0")) or max(GEMINI_BURST, round(GEMINI_RPM * TYPICAL_JOB_S / 60))
+MAX_ACTIVE_JOBS_PER_OWNER = int(os.getenv("GENERATION_MAX_ACTIVE_JOBS", "1"))
+JOB_TTL_S = 24 * 60 * 60
+JOB_HEARTBEAT_S = 15
+JOB_STALE_S = 4 * JOB_HEARTBEAT_S   # Active jobs not touched for this long belong to a dead process
+JOB_DB_PATH = os.getenv(
+    "GENERATION_JOB_DB",
+    os.path.join(tempfile.gettempdir(), "quantum_generation_jobs.sqlite3")
+)
+
+ACTIVE_STATUSES = ("queued", "running")
+FINISHED_STATUSES = ("done", "failed")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    owner TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    status TEXT NOT NULL,
+    warnings TEXT NOT NULL DEFAULT '[]',
+    progress REAL NOT NULL DEFAULT 0,
+    error TEXT,
+    claimed INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    worker TEXT,
+    heartbeat_at REAL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_owner ON jobs(owner, claimed);
+CREATE TABLE IF NOT EXISTS job_cards (
+    job_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    card TEXT NOT NULL,
+    PRIMARY KEY (job_id, seq)
+);
+"""
+
+
+class JobStore:
+    """Tiny SQLite-backed job table (one connection, serialized by a lock).
+    Several processes may share the file: each one marks its jobs with its own
+    worker id and keeps their heartbeat fresh."""
+
+    def __init__(self, path=JOB_DB_PATH):
+        try:
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+        except sqlite3.Error:
+            self._conn = sqlite3.connect(":memory:", check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        self.worker = uuid.uuid4().hex
+        with self._lock:
+            self._conn.executescript(_SCHEMA)
+            for column in ("worker TEXT", "heartbeat_at REAL"):
+                try:
+                    self._conn.execute(f"ALTER TABLE jobs ADD COLUMN {column}")  # Tables from older versions
+                except sqlite3.OperationalError:
+                    pass
+            self._conn.commit()
+        self.heartbeat()
+
+    def _execute(self, sql, params=()):
+        with self._lock:
+            cur = self._conn.execute(sql, params)
+            self._conn.commit()
+            return cur
+
+    def _to_dict(self, row):
+        """Job row plus its cards (caller holds _lock)"""
+        if row is None:
+            return None
+        job = dict(row)
+        job["cards"] = [
+            json.loads(card) for (card,) in self._conn.execute(
+                "SELECT card FROM job_cards WHERE job_id = ? ORDER BY seq", (job["id"],)
+            )
+        ]
+        job["warnings"] = json.loads(job["warnings"])
+        return job
+
+    def heartbeat(self):
+        """Mark this process's active jobs alive and fail active jobs whose process stopped beating"""
+        now = time.time()
+        self._execute(
+            "UPDATE jobs SET heartbeat_at = ? WHERE worker = ? AND status IN ('queued', 'running')",
+            (now, self.worker)
+        )
+        cur = self._execute(
+            "UPDATE jobs SET status = 'failed', error = 'interrupted', updated_at = ? "
+            "WHERE status IN ('queued', 'running') AND COALESCE(heartbeat_at, updated_at) < ?",
+            (now, now - JOB_STALE_S)
+        )
+        if cur.rowcount:
+            metrics.incr("generation_jobs_interrupted", cur.rowcount)
+
+    def create(self, owner, kind, max_active=MAX_ACTIVE_JOBS_PER_OWNER):
+        """New queued job; None if the owner already has max_active unfinished jobs"""
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        cur = self._execute(
+            "INSERT INTO jobs (id, owner, kind, status, created_at, updated_at, worker, heartbeat_at) "
+            "SELECT ?, ?, ?, 'queued', ?, ?, ?, ? "
+            "WHERE (SELECT COUNT(*) FROM jobs WHERE owner = ? AND status IN ('queued', 'running')) < ?",
+            (job_id, owner, kind, now, now, self.worker, now, owner, max_active)
+        )
+        if not cur.rowcount:
+            return None
+        self._execute("DELETE FROM jobs WHERE created_at < ?", (now - JOB_TTL_S,))
+        self._execute("DELETE FROM job_cards WHERE job_id NOT IN (SELECT id FROM jobs)")
+        return job_id
+
+    def _insert_cards(self, job_id, start, cards):
+        """Caller holds _lock"""
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO job_cards (job_id, seq, card) VALUES (?, ?, ?)",
+            [(job_id, start + i, json.dumps(card, ensure_ascii=False)) for i, card in enumerate(cards)]
+        )
+        self._conn.execute("UPDATE jobs SET updated_at = ? WHERE id = ?", (time.time(), job_id))
+        self._conn.commit()
+
+    def append_cards(self, job_id, start, cards):
+        """Store cards as rows start, start + 1, ... (one insert per card, nothing rewritten)"""
+        with self._lock:
+            self._insert_cards(job_id, start, cards)
+
+    def replace_cards(self, job_id, cards):
+        with self._lock:
+            self._conn.execute("DELETE FROM job_cards WHERE job_id = ?", (job_id,))
+            self._insert_cards(job_id, 0, cards)
+
+    def update(self, job_id, **fields):
+        if "warnings" in fields:
+            fields["warnings"] = json.dumps(fields["warnings"], ensure_ascii=False)
+        fields["updated_at"] = time.time()
+        assignments = ", ".join(f"{k} = ?" for k in fields)
+        self._execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+
+    def get(self, job_id):
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            return self._to_dict(row)
+
+    def list_unclaimed(self, owner):
+        """Jobs of this owner whose result has not been picked up yet (oldest first)"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT * FROM jobs WHERE owner = ? AND claimed = 0 ORDER BY created_at", (owner,)
+            ).fetchall()
+            return [self._to_dict(r) for r in rows]
+
+    def claim(self, job_id):
+        """Atomically take a finished job's result; None if it is unfinished or already taken"""
+        cur = self._execute(
+            "UPDATE jobs SET claimed = 1, updated_at = ? WHERE id = ? AND claimed = 0 AND status IN ('done', 'failed')",
+            (time.time(), job_id)
+        )
+        return self.get(job_id) if cur.rowcount else None
+
+    def counts(self):
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return {status: count for status, count in rows}
+
+
+class JobHandle:
+    """Passed to the job function to report progress (thread-safe, no UI calls)"""
+
+    def __init__(self, store, job_id, submitted_at):
+        self._store = store
+        self.id = job_id
+        self.submitted_at = submitted_at  # jobs.created_at: includes the time spent queued
+        self.cards = []
+        self.warnings = []
+
+    def add_cards(self, cards):
+        cards = list(cards)
+        self._store.append_cards(self.id, len(self.cards), cards)
+        self.cards.extend(cards)
+
+    def replace_cards(self, cards):
+        self.cards = list(cards)
+        self._store.replace_cards(self.id, self.cards)
+
+    def warn(self, message):
+        self.warnings.append(message)
+        self._store.update(self.id, warnings=self.warnings)
+
+    def set_progress(self, fraction):
+        self._store.update(self.id, progress=min(1.0, max(0.0, fraction)))
+
+
+class JobRunner:
+    """Worker pool that runs job functions and records their outcome"""
+
+    def __init__(self, store, workers=JOB_WORKERS):
+        self.store = store
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="generation-job")
+        threading.Thread(target=self._beat, name="generation-job-heartbeat", daemon=True).start()
+
+    def _beat(self):
+        while True:
+            time.sleep(JOB_HEARTBEAT_S)
+            try:
+                self.store.heartbeat()
+            except sqlite3.Error:
+                pass  # Locked by another process; the next beat is well within JOB_STALE_S
+
+    def submit(self, owner, kind, fn, *args):
+        """Queue fn(job_handle, *args); returns the job id immediately
+        (None if the owner already has as many unfinished jobs as allowed)"""
+        job_id = self.store.create(owner, kind)
+        if job_id is None:
+            metrics.incr("generation_jobs_refused")
+            return None
+        metrics.incr("generation_jobs_submitted")
+        self._pool.submit(self._run, job_id, fn, args)
+        return job_id
+
+    def _run(self, job_id, fn, args):
+        handle = JobHandle(self.store, job_id, self.store.get(job_id)["created_at"])
+        self.store.update(job_id, status="running")
+        started = time.time()
+        try:
+            fn(handle, *args)
+            self.store.update(job_id, status="done", progress=1.0)
+        except Exception as e:
+            metrics.incr("generation_jobs_failed")
+            self.store.update(job_id, status="failed", error=f"{type(e).__name__}: {e}")
+        finally:
+            metrics.record("generation_job_runtime", time.time() - started)
+
+
+_runner = None
+_runner_lock = threading.Lock()
+
+
+def get_job_runner() -> JobRunner:
+    """Get the process-wide job runner"""
+    global _runner
+    if _runner is None:
+        with _runner_lock:
+            if _runner is None:
+                _runner = JobRunner(JobStore())
+    return _runner
@@ -0,0 +1,65 @@
+# Process-wide metrics for QUANTUM (shown in the admin settings tab)
+import threading
+from collections import deque
+
+_lock = threading.Lock()
+_counters = {}
+_timings = {}
+
+TIMING_WINDOW = 200  # Recent samples kept per timing for percentiles
+
+
+def incr(name: str, amount: int = 1):
+    """Increment a counter"""
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + amount
+
+
+def record(name: str, seconds: float):
+    """Record one timing sample"""
+    with _lock:
+        samples = _timings.get(name)
+        if samples is None:
+            samples = _timings[name] = {"count": 0, "total": 0.0, "recent": deque(maxlen=TIMING_WINDOW)}
+        samples["count"] += 1
+        samples["total"] += seconds
+        samples["recent"].append(seconds)
+
+
+def _percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    idx = min(len(sorted_values) - 1, int(round(pct * (len(sorted_values) - 1))))
+    return sorted_values[idx]
+
+
+def timing(name: str):
+    """Summary of one timing: count, avg, p50, p95, last (seconds)"""
+    with _lock:
+        samples = _timings.get(name)
+        if not samples:
+            return {"count": 0, "avg": 0.0, "p50": 0.0, "p95": 0.0, "last": 0.0}
+        recent = list(samples["recent"])
+        count, total = samples["count"], samples["total"]
+    ordered = sorted(recent)
+    return {
+        "count": count,
+        "avg": total / count,
+        "p50": _percentile(ordered, 0.5),
+        "p95": _percentile(ordered, 0.95),
+        "last": recent[-1],
+    }
+
+
+def counter(name: str) -> int:
+    """Current value of a counter"""
+    with _lock:
+        return _counters.get(name, 0)
+
+
+def snapshot():
+    """All counters and timing summaries"""
+    with _lock:
+        names = list(_timings)
+        counters = dict(_counters)
+    return {"counters": counters, "timings": {n: timing(n) for n in names}}
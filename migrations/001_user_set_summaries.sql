@@ -0,0 +1,47 @@
+-- 001: Set listing with card counts in one round trip (get_user_sets)
+-- Run this in Supabase SQL Editor after database_schema.sql
+
+-- When a card was last graded (maintained by trigger, no client change needed)
+ALTER TABLE flashcards ADD COLUMN IF NOT EXISTS last_reviewed_at TIMESTAMP WITH TIME ZONE;
+
+CREATE OR REPLACE FUNCTION touch_last_reviewed_at()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF NEW.times_reviewed IS DISTINCT FROM OLD.times_reviewed THEN
+        NEW.last_reviewed_at := NOW();
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS flashcards_touch_last_reviewed ON flashcards;
+CREATE TRIGGER flashcards_touch_last_reviewed
+    BEFORE UPDATE ON flashcards
+    FOR EACH ROW EXECUTE FUNCTION touch_last_reviewed_at();
+
+-- Every set of a user with card count, due count and last study time.
+-- SECURITY INVOKER: RLS still limits rows to the caller's own sets.
+CREATE OR REPLACE FUNCTION get_user_set_summaries(p_user_id UUID)
+RETURNS TABLE (
+    id UUID,
+    name TEXT,
+    is_public BOOLEAN,
+    university TEXT,
+    course TEXT,
+    subject TEXT,
+    created_at TIMESTAMP WITH TIME ZONE,
+    card_count BIGINT,
+    due_count BIGINT,
+    last_studied_at TIMESTAMP WITH TIME ZONE
+)
+LANGUAGE sql STABLE SECURITY INVOKER AS $$
+    SELECT s.id, s.name, s.is_public, s.university, s.course, s.subject, s.created_at,
+           COUNT(f.id) AS card_count,
+           COUNT(f.id) FILTER (WHERE f.next_review <= NOW()) AS due_count,
+           MAX(f.last_reviewed_at) AS last_studied_at
+    FROM flashcard_sets s
+    LEFT JOIN flashcards f ON f.set_id = s.id
+    WHERE s.user_id = p_user_id
+    GROUP BY s.id
+    ORDER BY s.created_at DESC;
+$$;
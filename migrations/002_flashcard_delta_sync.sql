@@ -0,0 +1,120 @@
+-- 002: Delta sync of a user's deck (sync_flashcards_from_supabase)
+-- Run this in Supabase SQL Editor after 001_user_set_summaries.sql
+
+-- Last change of each card (maintained by trigger)
+ALTER TABLE flashcards ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW();
+UPDATE flashcards SET updated_at = COALESCE(created_at, NOW()) WHERE updated_at IS NULL;
+
+CREATE OR REPLACE FUNCTION touch_flashcard_updated_at()
+RETURNS TRIGGER AS $$
+BEGIN
+    NEW.updated_at := NOW();
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS flashcards_touch_updated_at ON flashcards;
+CREATE TRIGGER flashcards_touch_updated_at
+    BEFORE INSERT OR UPDATE ON flashcards
+    FOR EACH ROW EXECUTE FUNCTION touch_flashcard_updated_at();
+
+CREATE INDEX IF NOT EXISTS idx_flashcards_set_updated ON flashcards(set_id, updated_at);
+
+-- Tombstones: ids of deleted cards, so clients can drop them without a full reload
+CREATE TABLE IF NOT EXISTS flashcard_tombstones (
+    card_id UUID PRIMARY KEY,
+    user_id UUID REFERENCES auth.users(id) ON DELETE CASCADE,
+    deleted_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+ALTER TABLE flashcard_tombstones ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Users can view own tombstones" ON flashcard_tombstones
+    FOR SELECT USING (auth.uid() = user_id);
+
+CREATE INDEX IF NOT EXISTS idx_flashcard_tombstones_user ON flashcard_tombstones(user_id, deleted_at);
+
+-- Triggers write tombstones with the owner's rights bypassed (no client INSERT policy)
+CREATE OR REPLACE FUNCTION record_flashcard_tombstone()
+RETURNS TRIGGER
+LANGUAGE plpgsql SECURITY DEFINER SET search_path = public AS $$
+DECLARE
+    owner UUID;
+BEGIN
+    SELECT user_id INTO owner FROM flashcard_sets WHERE id = OLD.set_id;
+    -- NULL when the set itself is being deleted: record_set_tombstones already ran
+    IF owner IS NOT NULL THEN
+        INSERT INTO flashcard_tombstones (card_id, user_id) VALUES (OLD.id, owner)
+        ON CONFLICT (card_id) DO UPDATE SET deleted_at = NOW();
+    END IF;
+    RETURN OLD;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS flashcards_record_tombstone ON flashcards;
+CREATE TRIGGER flashcards_record_tombstone
+    AFTER DELETE ON flashcards
+    FOR EACH ROW EXECUTE FUNCTION record_flashcard_tombstone();
+
+CREATE OR REPLACE FUNCTION record_set_tombstones()
+RETURNS TRIGGER
+LANGUAGE plpgsql SECURITY DEFINER SET search_path = public AS $$
+BEGIN
+    INSERT INTO flashcard_tombstones (card_id, user_id)
+    SELECT id, OLD.user_id FROM flashcards WHERE set_id = OLD.id
+    ON CONFLICT (card_id) DO UPDATE SET deleted_at = NOW();
+    RETURN OLD;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS flashcard_sets_record_tombstones ON flashcard_sets;
+CREATE TRIGGER flashcard_sets_record_tombstones
+    BEFORE DELETE ON flashcard_sets
+    FOR EACH ROW EXECUTE FUNCTION record_set_tombstones();
+
+-- Changes since a watermark in one call.
+-- p_since NULL returns only a fresh watermark (used before a full load).
+-- The watermark trails NOW() so rows from transactions still in flight are
+-- picked up again next time; clients merge by id, so repeats are harmless.
+-- "truncated" means more than p_limit rows changed: do a full reload instead.
+CREATE OR REPLACE FUNCTION get_flashcard_changes(
+    p_user_id UUID,
+    p_since TIMESTAMP WITH TIME ZONE,
+    p_limit INTEGER DEFAULT 1000
+)
+RETURNS JSON
+LANGUAGE plpgsql STABLE SECURITY INVOKER AS $$
+DECLARE
+    changed JSON;
+    deleted JSON;
+    changed_count INTEGER;
+BEGIN
+    IF p_since IS NULL THEN
+        RETURN json_build_object(
+            'watermark', NOW() - INTERVAL '30 seconds',
+            'cards', '[]'::JSON, 'deleted', '[]'::JSON, 'truncated', FALSE
+        );
+    END IF;
+
+    SELECT COALESCE(json_agg(c), '[]'::JSON), COUNT(*) INTO changed, changed_count
+    FROM (
+        SELECT f.id, f.set_id, f.question, f.answer, f.difficulty, f.next_review, f.times_reviewed
+        FROM flashcards f
+        JOIN flashcard_sets s ON s.id = f.set_id
+        WHERE s.user_id = p_user_id AND f.updated_at > p_since
+        ORDER BY f.updated_at
+        LIMIT p_limit + 1
+    ) c;
+
+    SELECT COALESCE(json_agg(t.card_id), '[]'::JSON) INTO deleted
+    FROM flashcard_tombstones t
+    WHERE t.user_id = p_user_id AND t.deleted_at > p_since;
+
+    RETURN json_build_object(
+        'watermark', NOW() - INTERVAL '30 seconds',
+        'cards', changed,
+        'deleted', deleted,
+        'truncated', changed_count > p_limit
+    );
+END;
+$$;
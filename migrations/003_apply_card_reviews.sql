@@ -0,0 +1,134 @@
+-- 003: Apply review grades atomically in one call (update_card_progress, update_streak, review buffer)
+-- Run this in Supabase SQL Editor after 002_flashcard_delta_sync.sql
+
+-- Spaced repetition intervals (same table as SR_INTERVALS in app.py)
+CREATE OR REPLACE FUNCTION sr_interval_days(p_difficulty INTEGER)
+RETURNS INTEGER
+LANGUAGE sql IMMUTABLE AS $$
+    SELECT CASE p_difficulty
+        WHEN 1 THEN 1
+        WHEN 2 THEN 1
+        WHEN 3 THEN 3
+        WHEN 4 THEN 7
+        WHEN 5 THEN 14
+        ELSE 3
+    END;
+$$;
+
+-- Every applied grade; the primary key makes retried batches no-ops.
+-- Kept for card_review_retention() only (migrations/008).
+CREATE TABLE IF NOT EXISTS card_reviews (
+    id UUID PRIMARY KEY,
+    user_id UUID REFERENCES auth.users(id) ON DELETE CASCADE,
+    card_id UUID REFERENCES flashcards(id) ON DELETE CASCADE,
+    difficulty INTEGER NOT NULL CHECK (difficulty >= 1 AND difficulty <= 5),
+    reviewed_at TIMESTAMP WITH TIME ZONE NOT NULL,
+    study_date DATE NOT NULL
+);
+
+ALTER TABLE card_reviews ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Users can view own reviews" ON card_reviews
+    FOR SELECT USING (auth.uid() = user_id);
+
+CREATE POLICY "Users can insert own reviews" ON card_reviews
+    FOR INSERT WITH CHECK (
+        auth.uid() = user_id
+        AND card_id IN (
+            SELECT f.id FROM flashcards f
+            JOIN flashcard_sets s ON s.id = f.set_id
+            WHERE s.user_id = auth.uid()
+        )
+    );
+
+CREATE INDEX IF NOT EXISTS idx_card_reviews_user ON card_reviews(user_id, reviewed_at);
+
+-- Apply a batch of grades: [{"id", "card_id", "difficulty", "reviewed_at", "study_date"}, ...]
+-- For each card: times_reviewed += grades in the batch, difficulty and
+-- next_review from the latest grade. Streak and totals are advanced once per
+-- study day, oldest day first. Grades whose id was already applied are skipped,
+-- so a retry after a lost response changes nothing.
+-- SECURITY INVOKER: RLS still limits writes to the caller's own cards and profile.
+CREATE OR REPLACE FUNCTION apply_card_reviews(p_user_id UUID, p_reviews JSONB)
+RETURNS JSON
+LANGUAGE plpgsql SECURITY INVOKER AS $$
+DECLARE
+    study_day RECORD;
+    prof RECORD;
+    new_streak INTEGER;
+    applied INTEGER;
+BEGIN
+    CREATE TEMP TABLE IF NOT EXISTS _new_reviews (
+        card_id UUID, difficulty INTEGER, reviewed_at TIMESTAMP WITH TIME ZONE, study_date DATE
+    ) ON COMMIT DROP;
+    TRUNCATE _new_reviews;
+
+    WITH inserted AS (
+        INSERT INTO card_reviews (id, user_id, card_id, difficulty, reviewed_at, study_date)
+        SELECT r.id, p_user_id, r.card_id, r.difficulty, r.reviewed_at, r.study_date
+        FROM jsonb_to_recordset(p_reviews) AS r(
+            id UUID, card_id UUID, difficulty INTEGER,
+            reviewed_at TIMESTAMP WITH TIME ZONE, study_date DATE
+        )
+        JOIN flashcards f ON f.id = r.card_id
+        ON CONFLICT (id) DO NOTHING
+        RETURNING card_id, difficulty, reviewed_at, study_date
+    )
+    INSERT INTO _new_reviews SELECT * FROM inserted;
+
+    SELECT COUNT(*) INTO applied FROM _new_reviews;
+    IF applied = 0 THEN
+        RETURN json_build_object('applied', 0);
+    END IF;
+
+    UPDATE flashcards f
+    SET times_reviewed = COALESCE(f.times_reviewed, 0) + g.grades,
+        difficulty = g.difficulty,
+        next_review = g.reviewed_at + make_interval(days => sr_interval_days(g.difficulty))
+    FROM (
+        SELECT DISTINCT ON (card_id)
+               card_id, difficulty, reviewed_at,
+               COUNT(*) OVER (PARTITION BY card_id) AS grades
+        FROM _new_reviews
+        ORDER BY card_id, reviewed_at DESC
+    ) g
+    WHERE f.id = g.card_id;
+
+    -- Streak: row lock so two devices cannot both read the old value
+    SELECT streak_count, last_study_date, longest_streak, total_cards_studied
+    INTO prof FROM profiles WHERE id = p_user_id FOR UPDATE;
+
+    FOR study_day IN
+        SELECT study_date, COUNT(*) AS cards FROM _new_reviews GROUP BY study_date ORDER BY study_date
+    LOOP
+        IF prof.last_study_date IS NULL THEN
+            new_streak := 1;
+        ELSIF study_day.study_date - prof.last_study_date = 1 THEN
+            new_streak := COALESCE(prof.streak_count, 0) + 1;
+        ELSIF study_day.study_date - prof.last_study_date > 1 THEN
+            new_streak := 1;
+        ELSE
+            new_streak := COALESCE(prof.streak_count, 0);  -- Same day (or an older one)
+        END IF;
+
+        prof.streak_count := new_streak;
+        prof.longest_streak := GREATEST(COALESCE(prof.longest_streak, 0), new_streak);
+        prof.total_cards_studied := COALESCE(prof.total_cards_studied, 0) + study_day.cards;
+        prof.last_study_date := GREATEST(prof.last_study_date, study_day.study_date);
+    END LOOP;
+
+    UPDATE profiles
+    SET streak_count = prof.streak_count,
+        longest_streak = prof.longest_streak,
+        total_cards_studied = prof.total_cards_studied,
+        last_study_date = prof.last_study_date
+    WHERE id = p_user_id;
+
+    RETURN json_build_object(
+        'applied', applied,
+        'streak', prof.streak_count,
+        'longest', prof.longest_streak,
+        'total', prof.total_cards_studied
+    );
+END;
+$$;
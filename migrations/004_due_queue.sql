@@ -0,0 +1,43 @@
+-- 004: Server-side due queue (first page of a deck load, get_cards_for_review)
+-- Run this in Supabase SQL Editor after 003_apply_card_reviews.sql
+
+-- Due cards of a set in overdue order, straight from the index
+CREATE INDEX IF NOT EXISTS idx_flashcards_set_next_review ON flashcards(set_id, next_review);
+
+-- Due count plus the p_limit most overdue cards of a user.
+-- Each set contributes at most p_limit rows through the index (LATERAL ... LIMIT),
+-- so the first card costs the same with 20 or 20k overdue cards. The count is
+-- an index-only scan over (set_id, next_review), i.e. O(due cards): the app
+-- fetches it once per deck load and keeps it up to date locally.
+-- SECURITY INVOKER: RLS still limits rows to the caller's own sets.
+CREATE OR REPLACE FUNCTION get_due_queue(p_user_id UUID, p_limit INTEGER DEFAULT 20)
+RETURNS JSON
+LANGUAGE sql STABLE SECURITY INVOKER AS $$
+    WITH user_sets AS (
+        SELECT id FROM flashcard_sets WHERE user_id = p_user_id
+    )
+    SELECT json_build_object(
+        'due_count', (
+            SELECT COUNT(*)
+            FROM user_sets s
+            JOIN flashcards f ON f.set_id = s.id
+            WHERE f.next_review <= NOW()
+        ),
+        'cards', COALESCE((
+            SELECT json_agg(c ORDER BY c.next_review)
+            FROM (
+                SELECT f.*
+                FROM user_sets s
+                CROSS JOIN LATERAL (
+                    SELECT id, set_id, question, answer, difficulty, next_review, times_reviewed
+                    FROM flashcards
+                    WHERE set_id = s.id AND next_review <= NOW()
+                    ORDER BY next_review
+                    LIMIT p_limit
+                ) f
+                ORDER BY f.next_review
+                LIMIT p_limit
+            ) c
+        ), '[]'::JSON)
+    );
+$$;
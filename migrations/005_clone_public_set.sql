@@ -0,0 +1,43 @@
+-- 005: Clone a community set inside the database (clone_public_set)
+-- Run this in Supabase SQL Editor after 004_due_queue.sql
+
+-- Download counter of a public set. SECURITY DEFINER because the caller does not
+-- own the set (RLS would block the UPDATE); it can only add one to a public set.
+CREATE OR REPLACE FUNCTION increment_downloads(set_id_param UUID)
+RETURNS VOID
+LANGUAGE sql SECURITY DEFINER SET search_path = public AS $$
+    UPDATE flashcard_sets
+    SET downloads_count = COALESCE(downloads_count, 0) + 1
+    WHERE id = set_id_param AND is_public = TRUE;
+$$;
+
+-- Copy a set and all its cards for p_user_id without leaving the database.
+-- Cards start fresh (difficulty 3, due now). Returns the new set id.
+-- SECURITY INVOKER: the source must be visible to the caller (own or public)
+-- and the copy must belong to the caller, as with the client-side clone.
+CREATE OR REPLACE FUNCTION clone_flashcard_set(p_set_id UUID, p_user_id UUID)
+RETURNS UUID
+LANGUAGE plpgsql SECURITY INVOKER AS $$
+DECLARE
+    new_set_id UUID;
+BEGIN
+    INSERT INTO flashcard_sets (user_id, name, is_public)
+    SELECT p_user_id, name || ' (Kopija)', FALSE
+    FROM flashcard_sets
+    WHERE id = p_set_id
+    RETURNING id INTO new_set_id;
+
+    IF new_set_id IS NULL THEN
+        RAISE EXCEPTION 'Rinkinys nerastas';
+    END IF;
+
+    INSERT INTO flashcards (set_id, question, answer, difficulty, next_review, times_reviewed)
+    SELECT new_set_id, question, answer, 3, NOW(), 0
+    FROM flashcards
+    WHERE set_id = p_set_id
+    ORDER BY created_at, id;
+
+    PERFORM increment_downloads(p_set_id);
+    RETURN new_set_id;
+END;
+$$;
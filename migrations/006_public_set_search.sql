@@ -0,0 +1,114 @@
+-- 006: Indexed, ranked community search (get_public_sets)
+-- Run this in Supabase SQL Editor after 005_clone_public_set.sql
+
+CREATE EXTENSION IF NOT EXISTS unaccent WITH SCHEMA extensions;
+CREATE EXTENSION IF NOT EXISTS pg_trgm WITH SCHEMA extensions;
+
+-- Lowercase and strip diacritics (ą č ę ė į š ų ū ž -> a c e e i s u u z), so
+-- "ekonomika" finds "Ekonomikos pagrindai" and "zmogaus" finds "Žmogaus anatomija".
+-- IMMUTABLE wrapper (unaccent itself is only STABLE) so it can back generated columns.
+CREATE OR REPLACE FUNCTION fold_search_text(p_text TEXT)
+RETURNS TEXT
+LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+    SELECT lower(extensions.unaccent('extensions.unaccent'::regdictionary, COALESCE(p_text, '')));
+$$;
+
+ALTER TABLE flashcard_sets ADD COLUMN IF NOT EXISTS search_text TEXT
+    GENERATED ALWAYS AS (
+        fold_search_text(COALESCE(name, '') || ' ' || COALESCE(course, '') || ' ' || COALESCE(subject, ''))
+    ) STORED;
+
+-- Name weighs more than course/subject. 'simple' config: there is no Lithuanian
+-- stemmer in Postgres, prefix matching (word:*) covers inflected endings instead.
+ALTER TABLE flashcard_sets ADD COLUMN IF NOT EXISTS search_vector TSVECTOR
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('simple', fold_search_text(name)), 'A') ||
+        setweight(to_tsvector('simple', fold_search_text(COALESCE(course, '') || ' ' || COALESCE(subject, ''))), 'B')
+    ) STORED;
+
+CREATE INDEX IF NOT EXISTS idx_flashcard_sets_search_vector
+    ON flashcard_sets USING GIN (search_vector) WHERE is_public = TRUE;
+CREATE INDEX IF NOT EXISTS idx_flashcard_sets_search_trgm
+    ON flashcard_sets USING GIN (search_text extensions.gin_trgm_ops) WHERE is_public = TRUE;
+CREATE INDEX IF NOT EXISTS idx_flashcard_sets_public_downloads
+    ON flashcard_sets (downloads_count DESC) WHERE is_public = TRUE;
+
+-- Public sets matching p_query (word prefixes, substrings or close typos),
+-- ordered by text relevance plus a logarithmic popularity bonus.
+-- Without a query (the default listing): most downloaded first, straight off
+-- idx_flashcard_sets_public_downloads with LIMIT, no ranking or sort of all public sets.
+-- SECURITY DEFINER with an explicit projection: only public sets, and the author
+-- only as a masked label (never the email), so the result is the same for every
+-- caller and the app can share one cached listing across sessions.
+DROP FUNCTION IF EXISTS search_public_sets(TEXT, TEXT, INTEGER);  -- Return type changed (author_email -> author_label)
+CREATE FUNCTION search_public_sets(
+    p_query TEXT DEFAULT NULL,
+    p_university TEXT DEFAULT NULL,
+    p_limit INTEGER DEFAULT 50
+)
+RETURNS TABLE (
+    id UUID,
+    name TEXT,
+    university TEXT,
+    course TEXT,
+    subject TEXT,
+    downloads_count INTEGER,
+    created_at TIMESTAMP WITH TIME ZONE,
+    author_label TEXT,
+    rank REAL
+)
+LANGUAGE plpgsql STABLE SECURITY DEFINER SET search_path = public, extensions AS $$
+#variable_conflict use_column
+DECLARE
+    folded TEXT := trim(regexp_replace(fold_search_text(p_query), '[^[:alnum:]]+', ' ', 'g'));
+    prefix_query TEXT;
+BEGIN
+    SELECT NULLIF(string_agg(quote_literal(word) || ':*', ' & '), '')
+    INTO prefix_query
+    FROM regexp_split_to_table(folded, '\s+') AS word
+    WHERE word <> '';
+
+    IF prefix_query IS NULL THEN
+        RETURN QUERY
+        SELECT s.id, s.name, s.university, s.course, s.subject, s.downloads_count, s.created_at,
+               CASE WHEN p.email LIKE '%@%'
+                    THEN left(split_part(p.email, '@', 1), 3) || '***@' || split_part(p.email, '@', 2)
+               END AS author_label,
+               (0.1 * ln(1 + COALESCE(s.downloads_count, 0)))::REAL AS rank
+        FROM flashcard_sets s
+        LEFT JOIN profiles p ON p.id = s.user_id
+        WHERE s.is_public = TRUE
+          AND (p_university IS NULL OR s.university = p_university)
+        ORDER BY s.downloads_count DESC
+        LIMIT p_limit;
+        RETURN;
+    END IF;
+
+    RETURN QUERY
+    WITH matches AS (
+        SELECT s.*,
+               ts_rank(s.search_vector, to_tsquery('simple', prefix_query))
+                   + similarity(s.search_text, folded) AS relevance
+        FROM flashcard_sets s
+        WHERE s.is_public = TRUE
+          AND (p_university IS NULL OR s.university = p_university)
+          AND (
+              s.search_vector @@ to_tsquery('simple', prefix_query)
+              OR s.search_text LIKE '%' || folded || '%'
+              OR s.search_text % folded
+          )
+    )
+    SELECT m.id, m.name, m.university, m.course, m.subject, m.downloads_count, m.created_at,
+           CASE WHEN p.email LIKE '%@%'
+                    THEN left(split_part(p.email, '@', 1), 3) || '***@' || split_part(p.email, '@', 2)
+               END AS author_label,
+           (m.relevance + 0.1 * ln(1 + COALESCE(m.downloads_count, 0)))::REAL AS rank
+    FROM matches m
+    LEFT JOIN profiles p ON p.id = m.user_id
+    ORDER BY rank DESC, m.downloads_count DESC NULLS LAST
+    LIMIT p_limit;
+END;
+$$;
+
+-- Latency against table size (10k vs 100k public sets, with and without a query):
+-- tests/test_db_benchmarks.py, run against a staging project with QUANTUM_BENCH_DSN set.
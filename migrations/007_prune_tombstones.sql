@@ -0,0 +1,98 @@
+-- 007: Bounded tombstone table for delta sync (get_flashcard_changes)
+-- Run this in Supabase SQL Editor after 006_public_set_search.sql
+
+-- Tombstones only need to outlive the oldest watermark a client still syncs from.
+-- Watermarks live in browser sessions (30 min inactivity logout), so a week is
+-- generous; a client with an older watermark is told to do a full reload instead.
+CREATE OR REPLACE FUNCTION flashcard_tombstone_retention()
+RETURNS INTERVAL
+LANGUAGE sql IMMUTABLE AS $$
+    SELECT INTERVAL '7 days';
+$$;
+
+CREATE INDEX IF NOT EXISTS idx_flashcard_tombstones_deleted ON flashcard_tombstones(deleted_at);
+
+-- Drop tombstones past the retention window; returns how many were removed.
+-- SECURITY DEFINER: clients have no DELETE policy on flashcard_tombstones.
+CREATE OR REPLACE FUNCTION prune_flashcard_tombstones()
+RETURNS INTEGER
+LANGUAGE plpgsql SECURITY DEFINER SET search_path = public AS $$
+DECLARE
+    removed INTEGER;
+BEGIN
+    DELETE FROM flashcard_tombstones
+    WHERE deleted_at < NOW() - flashcard_tombstone_retention();
+    GET DIAGNOSTICS removed = ROW_COUNT;
+    RETURN removed;
+END;
+$$;
+
+-- Deleting a set also clears the owner's expired tombstones (uses idx_flashcard_tombstones_user)
+CREATE OR REPLACE FUNCTION record_set_tombstones()
+RETURNS TRIGGER
+LANGUAGE plpgsql SECURITY DEFINER SET search_path = public AS $$
+BEGIN
+    DELETE FROM flashcard_tombstones
+    WHERE user_id = OLD.user_id AND deleted_at < NOW() - flashcard_tombstone_retention();
+
+    INSERT INTO flashcard_tombstones (card_id, user_id)
+    SELECT id, OLD.user_id FROM flashcards WHERE set_id = OLD.id
+    ON CONFLICT (card_id) DO UPDATE SET deleted_at = NOW();
+    RETURN OLD;
+END;
+$$;
+
+-- Same as 002, plus: a watermark older than the retention window may have
+-- missed pruned tombstones, so it is answered with "truncated" (full reload).
+CREATE OR REPLACE FUNCTION get_flashcard_changes(
+    p_user_id UUID,
+    p_since TIMESTAMP WITH TIME ZONE,
+    p_limit INTEGER DEFAULT 1000
+)
+RETURNS JSON
+LANGUAGE plpgsql STABLE SECURITY INVOKER AS $$
+DECLARE
+    changed JSON;
+    deleted JSON;
+    changed_count INTEGER;
+BEGIN
+    IF p_since IS NULL THEN
+        RETURN json_build_object(
+            'watermark', NOW() - INTERVAL '30 seconds',
+            'cards', '[]'::JSON, 'deleted', '[]'::JSON, 'truncated', FALSE
+        );
+    END IF;
+
+    IF p_since < NOW() - flashcard_tombstone_retention() THEN
+        RETURN json_build_object(
+            'watermark', NOW() - INTERVAL '30 seconds',
+            'cards', '[]'::JSON, 'deleted', '[]'::JSON, 'truncated', TRUE
+        );
+    END IF;
+
+    SELECT COALESCE(json_agg(c), '[]'::JSON), COUNT(*) INTO changed, changed_count
+    FROM (
+        SELECT f.id, f.set_id, f.question, f.answer, f.difficulty, f.next_review, f.times_reviewed
+        FROM flashcards f
+        JOIN flashcard_sets s ON s.id = f.set_id
+        WHERE s.user_id = p_user_id AND f.updated_at > p_since
+        ORDER BY f.updated_at
+        LIMIT p_limit + 1
+    ) c;
+
+    SELECT COALESCE(json_agg(t.card_id), '[]'::JSON) INTO deleted
+    FROM flashcard_tombstones t
+    WHERE t.user_id = p_user_id AND t.deleted_at > p_since;
+
+    RETURN json_build_object(
+        'watermark', NOW() - INTERVAL '30 seconds',
+        'cards', changed,
+        'deleted', deleted,
+        'truncated', changed_count > p_limit
+    );
+END;
+$$;
+
+-- Nightly sweep for users who never delete another set (needs the pg_cron extension):
+--
+--   SELECT cron.schedule('prune-flashcard-tombstones', '17 3 * * *', 'SELECT prune_flashcard_tombstones()');
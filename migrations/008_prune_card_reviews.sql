@@ -0,0 +1,69 @@
+-- 008: Bounded card_reviews table (apply_card_reviews grade ids)
+-- Run this in Supabase SQL Editor after 007_prune_tombstones.sql
+
+-- A grade id only has to outlive the review buffer's retries. Those normally
+-- happen within seconds, but a journal backlog waits for the owner's next
+-- login, so keep a month; a grade older than that is not applied at all,
+-- since its id may already have been pruned (and its next_review is long past).
+CREATE OR REPLACE FUNCTION card_review_retention()
+RETURNS INTERVAL
+LANGUAGE sql IMMUTABLE AS $$
+    SELECT INTERVAL '30 days';
+$$;
+
+CREATE INDEX IF NOT EXISTS idx_card_reviews_reviewed ON card_reviews(reviewed_at);
+
+-- Drop grades past the retention window; returns how many were removed.
+-- SECURITY DEFINER: clients have no DELETE policy on card_reviews.
+CREATE OR REPLACE FUNCTION prune_card_reviews()
+RETURNS INTEGER
+LANGUAGE plpgsql SECURITY DEFINER SET search_path = public AS $$
+DECLARE
+    removed INTEGER;
+BEGIN
+    DELETE FROM card_reviews
+    WHERE reviewed_at < NOW() - card_review_retention();
+    GET DIAGNOSTICS removed = ROW_COUNT;
+    RETURN removed;
+END;
+$$;
+
+-- Grades older than the window are skipped (apply_card_reviews only applies
+-- the rows this insert returns, so they change nothing)
+CREATE OR REPLACE FUNCTION skip_expired_card_review()
+RETURNS TRIGGER
+LANGUAGE plpgsql AS $$
+BEGIN
+    IF NEW.reviewed_at < NOW() - card_review_retention() THEN
+        RETURN NULL;
+    END IF;
+    RETURN NEW;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS card_reviews_skip_expired ON card_reviews;
+CREATE TRIGGER card_reviews_skip_expired
+    BEFORE INSERT ON card_reviews
+    FOR EACH ROW EXECUTE FUNCTION skip_expired_card_review();
+
+-- Each applied batch also clears its users' expired grades (uses idx_card_reviews_user)
+CREATE OR REPLACE FUNCTION prune_expired_card_reviews_of_batch()
+RETURNS TRIGGER
+LANGUAGE plpgsql SECURITY DEFINER SET search_path = public AS $$
+BEGIN
+    DELETE FROM card_reviews
+    WHERE user_id IN (SELECT DISTINCT user_id FROM new_reviews)
+      AND reviewed_at < NOW() - card_review_retention();
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS card_reviews_prune_expired ON card_reviews;
+CREATE TRIGGER card_reviews_prune_expired
+    AFTER INSERT ON card_reviews
+    REFERENCING NEW TABLE AS new_reviews
+    FOR EACH STATEMENT EXECUTE FUNCTION prune_expired_card_reviews_of_batch();
+
+-- Nightly sweep for users who stopped studying (needs the pg_cron extension):
+--
+--   SELECT cron.schedule('prune-card-reviews', '23 3 * * *', 'SELECT prune_card_reviews()');
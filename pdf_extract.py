@@ -0,0 +1,139 @@
+# PDF text extraction for QUANTUM
+# Pages are extracted in order and extraction stops as soon as the tier's
+# character limit is reached. The first batch of pages is read in-process; if
+# the limit then still looks many batches away, the rest of a large PDF is split
+# into page batches that run on a process pool (PyPDF2 is pure Python, so
+# threads would not help).
+import multiprocessing
+import os
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from io import BytesIO
+
+import PyPDF2
+
+PAGES_PER_BATCH = 20
+PARALLEL_MIN_PAGES = 60
+PDF_WORKERS = min(4, os.cpu_count() or 1)
+# Not fork: the Streamlit server is multi-threaded, and a forked child can inherit a held lock
+_START_METHOD = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ProcessPoolExecutor(max_workers=PDF_WORKERS,
+                                            mp_context=multiprocessing.get_context(_START_METHOD))
+    return _pool
+
+
+def _discard_pool(pool):
+    """Drop a pool whose worker died (e.g. killed on a huge PDF) so the next call gets a fresh one"""
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def count_pages(data: bytes) -> int:
+    """Number of pages (0 if the PDF cannot be opened)"""
+    try:
+        return len(PyPDF2.PdfReader(BytesIO(data)).pages)
+    except Exception:
+        return 0
+
+
+def _extract_batch(path, start, end):
+    """Worker: text of pages [start, end) from a PDF on disk"""
+    reader = PyPDF2.PdfReader(path)
+    return [reader.pages[i].extract_text() or "" for i in range(start, end)]
+
+
+def _iter_pages(reader, data, start, end, max_chars):
+    """Yield page texts in order: one batch in-process, then the rest in-process too
+    unless max_chars still looks more than a batch away on a large PDF"""
+    probe_end = min(start + PAGES_PER_BATCH, end)
+    length = 0
+    for i in range(start, probe_end):
+        text = reader.pages[i].extract_text() or ""
+        length += len(text) + 1
+        yield text
+
+    rest = end - probe_end
+    per_page = length / max(1, probe_end - start)
+    pages_needed = (max_chars - length) / per_page if per_page > 1 else rest
+    if rest >= PARALLEL_MIN_PAGES and pages_needed > PAGES_PER_BATCH and PDF_WORKERS > 1:
+        yield from _iter_parallel(data, probe_end, end)
+    else:
+        for i in range(probe_end, end):
+            yield reader.pages[i].extract_text() or ""
+
+
+def _iter_parallel(data, start, end):
+    """Yield page texts in order while at most PDF_WORKERS batches run ahead"""
+    fd, path = tempfile.mkstemp(suffix=".pdf")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        pool = _get_pool()
+        batches = [(s, min(s + PAGES_PER_BATCH, end)) for s in range(start, end, PAGES_PER_BATCH)]
+        pending = []
+        next_batch = 0
+        try:
+            while next_batch < len(batches) or pending:
+                while next_batch < len(batches) and len(pending) < PDF_WORKERS:
+                    pending.append(pool.submit(_extract_batch, path, *batches[next_batch]))
+                    next_batch += 1
+                yield from pending.pop(0).result()
+        except BrokenProcessPool:
+            _discard_pool(pool)
+            pending = []
+            raise
+        finally:
+            for future in pending:  # Early stop: drop batches nobody will read
+                future.cancel()
+            for future in pending:
+                if not future.cancelled():
+                    future.exception()  # Wait so the temp file is not removed under a worker
+    finally:
+        os.remove(path)
+
+
+def extract_text(data: bytes, max_chars: int, first_page: int = 0, last_page: int = None):
+    """Extract text of pages [first_page, last_page) until max_chars is reached.
+    Returns {'text', 'pages_read', 'total_pages', 'truncated'}; raises if the PDF cannot be read."""
+    reader = PyPDF2.PdfReader(BytesIO(data))
+    total_pages = len(reader.pages)
+    end = total_pages if last_page is None else min(last_page, total_pages)
+    start = max(0, min(first_page, end))
+
+    pages = _iter_pages(reader, data, start, end, max_chars)
+
+    parts = []
+    length = 0
+    pages_read = 0
+    truncated = False
+    for page_text in pages:
+        pages_read += 1
+        if page_text:
+            parts.append(page_text)
+            length += len(page_text) + 1
+        if length >= max_chars:
+            truncated = start + pages_read < end or length > max_chars
+            break
+    pages.close()
+
+    return {
+        "text": "\n".join(parts),
+        "pages_read": pages_read,
+        "total_pages": total_pages,
+        "truncated": truncated,
+    }
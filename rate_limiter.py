@@ -0,0 +1,117 @@
+# Process-wide Gemini rate limiter for QUANTUM
+# Every Gemini call (text, photos, tutor chat) from every session takes a token
+# here first, so one busy class cannot push the whole app over quota.
+import os
+import random
+import threading
+import time
+from collections import deque
+
+import metrics
+
+GEMINI_RPM = float(os.getenv("GEMINI_RPM", "60"))              # Sized to the project's Gemini quota
+GEMINI_BURST = int(os.getenv("GEMINI_BURST", "10"))
+GEMINI_QUEUE_TIMEOUT_S = float(os.getenv("GEMINI_QUEUE_TIMEOUT", "45"))
+RETRY_ATTEMPTS = 4
+BACKOFF_BASE_S = 1.0
+BACKOFF_CAP_S = 16.0
+
+
+class RateLimitTimeout(Exception):
+    """Waited in the queue past the deadline without getting a token"""
+
+
+def is_rate_limit_error(e) -> bool:
+    """True for Gemini 429 / quota / resource-exhausted errors"""
+    err = str(e).lower()
+    return "429" in err or "quota" in err or "resource_exhausted" in err or "rate limit" in err
+
+
+class TokenBucket:
+    """Token bucket with a FIFO wait queue and a per-request deadline"""
+
+    def __init__(self, rate_per_minute=GEMINI_RPM, burst=GEMINI_BURST):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = max(1, burst)
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._cond = threading.Condition()
+        self._queue = deque()
+        self.max_queue_depth = 0
+
+    def _refill(self, now):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, timeout=GEMINI_QUEUE_TIMEOUT_S):
+        """Block until a token is available (first come, first served). Returns seconds waited."""
+        started = time.monotonic()
+        deadline = started + timeout
+        ticket = object()
+        with self._cond:
+            self._queue.append(ticket)
+            self.max_queue_depth = max(self.max_queue_depth, len(self._queue))
+            try:
+                while True:
+                    now = time.monotonic()
+                    self._refill(now)
+                    if self._queue[0] is ticket and self._tokens >= 1:
+                        self._tokens -= 1
+                        waited = now - started
+                        metrics.record("gemini_queue_wait", waited)
+                        return waited
+                    remaining = deadline - now
+                    if remaining <= 0:
+                        metrics.incr("gemini_queue_timeouts")
+                        raise RateLimitTimeout("Gemini queue deadline exceeded")
+                    if self._queue[0] is ticket:
+                        delay = (1 - self._tokens) / self.rate
+                    else:
+                        delay = remaining  # Woken up when the head leaves
+                    self._cond.wait(min(delay, remaining))
+            finally:
+                self._queue.remove(ticket)
+                self._cond.notify_all()
+
+    def penalize(self):
+        """Drain the bucket after a 429 so other sessions back off too"""
+        with self._cond:
+            self._refill(time.monotonic())
+            self._tokens = min(self._tokens, 0.0)
+
+    def stats(self):
+        """Current saturation: queue depth and available tokens"""
+        with self._cond:
+            self._refill(time.monotonic())
+            return {
+                "queue_depth": len(self._queue),
+                "max_queue_depth": self.max_queue_depth,
+                "tokens": self._tokens,
+                "rpm": self.rate * 60,
+            }
+
+
+_limiter = TokenBucket()
+
+
+def get_limiter() -> TokenBucket:
+    """Get the process-wide Gemini limiter"""
+    return _limiter
+
+
+def call_gemini(fn, attempts=RETRY_ATTEMPTS, timeout=GEMINI_QUEUE_TIMEOUT_S):
+    """Run fn() under the limiter, retrying 429s with full-jitter exponential backoff"""
+    deadline = time.monotonic() + timeout
+    for attempt in range(attempts):
+        _limiter.acquire(timeout=max(0.0, deadline - time.monotonic()))
+        try:
+            return fn()
+        except Exception as e:
+            if not is_rate_limit_error(e) or attempt == attempts - 1:
+                raise
+            metrics.incr("gemini_429_retries")
+            _limiter.penalize()
+            sleep_s = random.uniform(0, min(BACKOFF_CAP_S, BACKOFF_BASE_S * 2 ** attempt))
+            if time.monotonic() + sleep_s >= deadline:
+                raise
+            time.sleep(sleep_s)
@@ -0,0 +1,214 @@
+# Write-behind review buffer for QUANTUM
+# Grades are applied to session state right away and appended to a local SQLite
+# journal. A background thread flushes them to Supabase in batches: on a timer,
+# when a user's backlog reaches a size threshold, and at logout / process exit.
+# Every grade carries a unique id, so retrying a batch after a failure (or a
+# lost response) does not apply it twice.
+import atexit
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+
+import metrics
+
+REVIEW_FLUSH_INTERVAL_S = float(os.getenv("REVIEW_FLUSH_INTERVAL", "10"))
+REVIEW_FLUSH_BATCH = int(os.getenv("REVIEW_FLUSH_BATCH", "20"))
+REVIEW_JOURNAL_PATH = os.getenv(
+    "REVIEW_JOURNAL_DB",
+    os.path.join(tempfile.gettempdir(), "quantum_review_journal.sqlite3")
+)
+FLUSHED_TTL_S = 24 * 60 * 60
+WRITER_IDLE_TTL_S = 30 * 60         # Same as the inactivity logout; a closed tab is never detached
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS reviews (
+    id TEXT PRIMARY KEY,
+    owner TEXT NOT NULL,
+    card_id TEXT NOT NULL,
+    difficulty INTEGER NOT NULL,
+    times_reviewed INTEGER NOT NULL,
+    next_review TEXT NOT NULL,
+    reviewed_at REAL NOT NULL,
+    flushed INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_reviews_owner ON reviews(owner, flushed);
+"""
+
+
+class ReviewJournal:
+    """Durable append-only log of grades (one connection, serialized by a lock)"""
+
+    def __init__(self, path=REVIEW_JOURNAL_PATH):
+        try:
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+        except sqlite3.Error:
+            self._conn = sqlite3.connect(":memory:", check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.executescript(_SCHEMA)
+            self._conn.execute("DELETE FROM reviews WHERE flushed = 1 AND reviewed_at < ?",
+                               (time.time() - FLUSHED_TTL_S,))
+            self._conn.commit()
+
+    def append(self, owner, review):
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO reviews (id, owner, card_id, difficulty, times_reviewed, next_review, reviewed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (uuid.uuid4().hex, owner, review["card_id"], review["difficulty"],
+                 review["times_reviewed"], review["next_review"], review.get("reviewed_at", time.time()))
+            )
+            self._conn.commit()
+
+    def pending(self, owner):
+        """Unflushed grades of this owner (oldest first)"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT * FROM reviews WHERE owner = ? AND flushed = 0 ORDER BY reviewed_at", (owner,)
+            ).fetchall()
+        return [dict(r) for r in rows]
+
+    def pending_count(self, owner):
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM reviews WHERE owner = ? AND flushed = 0", (owner,)
+            ).fetchone()[0]
+
+    def mark_flushed(self, ids):
+        with self._lock:
+            self._conn.executemany("UPDATE reviews SET flushed = 1 WHERE id = ?", [(i,) for i in ids])
+            self._conn.commit()
+
+
+def _is_auth_error(e) -> bool:
+    """PostgREST / GoTrue error for an expired or revoked session token"""
+    err = str(e)
+    return "JWT" in err or "PGRST301" in err or "401" in err
+
+
+class _Writer:
+    __slots__ = ("session", "write", "used_at")
+
+    def __init__(self, session, write):
+        self.session = session
+        self.write = write
+        self.used_at = time.time()
+
+
+class ReviewBuffer:
+    """Batches grades per user and flushes them with the user's most recently attached writer"""
+
+    def __init__(self, journal, interval=REVIEW_FLUSH_INTERVAL_S, batch=REVIEW_FLUSH_BATCH,
+                 idle_ttl=WRITER_IDLE_TTL_S):
+        self.journal = journal
+        self.interval = interval
+        self.batch = batch
+        self.idle_ttl = idle_ttl
+        self._writers = {}                  # owner -> _Writer (one per owner, replaced on attach)
+        self._owner_locks = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        threading.Thread(target=self._loop, name="review-flusher", daemon=True).start()
+
+    def attach(self, owner, session, writer):
+        """Register how this owner's grades are written, replacing the writer of an earlier
+        session (also picks up a backlog left by a restart)"""
+        with self._lock:
+            self._writers[owner] = _Writer(session, writer)
+            self._owner_locks.setdefault(owner, threading.Lock())
+        if self.journal.pending_count(owner):
+            self._wake.set()
+
+    def record(self, owner, review):
+        """Journal one grade; returns immediately"""
+        self.journal.append(owner, review)
+        with self._lock:
+            writer = self._writers.get(owner)
+            if writer is not None:
+                writer.used_at = time.time()  # Session still active
+        metrics.incr("reviews_buffered")
+        if self.journal.pending_count(owner) >= self.batch:
+            self._wake.set()
+
+    def pending_by_card(self, owner):
+        """Latest unflushed state per card id (to overlay on data loaded from the server)"""
+        return {r["card_id"]: r for r in self.journal.pending(owner)}
+
+    def flush(self, owner):
+        """Write this owner's backlog now. Returns True if nothing is left pending."""
+        with self._lock:
+            writer = self._writers.get(owner)
+            owner_lock = self._owner_locks.get(owner)
+        if writer is None:
+            return False
+        with owner_lock:
+            reviews = self.journal.pending(owner)
+            if not reviews:
+                return True
+            started = time.time()
+            try:
+                writer.write(reviews)
+            except Exception as e:
+                metrics.incr("review_flush_failures")
+                if _is_auth_error(e):
+                    self._drop(owner, writer)  # Token expired; the next attach brings a fresh one
+                return False  # Stays in the journal; the next tick retries
+            writer.used_at = time.time()
+            metrics.record("review_flush", time.time() - started)
+            metrics.incr("reviews_flushed", len(reviews))
+            self.journal.mark_flushed([r["id"] for r in reviews])
+            return True
+
+    def detach(self, owner, session):
+        """Flush and forget the writer (logout). A later session that attached its own is kept."""
+        done = self.flush(owner)
+        with self._lock:
+            writer = self._writers.get(owner)
+            if writer is not None and writer.session == session:
+                self._writers.pop(owner)
+        return done
+
+    def flush_all(self):
+        with self._lock:
+            owners = list(self._writers)
+        for owner in owners:
+            self.flush(owner)
+        self._expire_idle()
+
+    def _drop(self, owner, writer):
+        with self._lock:
+            if self._writers.get(owner) is writer:
+                self._writers.pop(owner)
+
+    def _expire_idle(self):
+        """Forget writers of sessions that stopped flushing or attaching (closed tabs);
+        their unflushed grades stay in the journal until the owner attaches again"""
+        cutoff = time.time() - self.idle_ttl
+        with self._lock:
+            for owner in [o for o, w in self._writers.items() if w.used_at < cutoff]:
+                self._writers.pop(owner)
+
+    def _loop(self):
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            self.flush_all()
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_review_buffer() -> ReviewBuffer:
+    """Get the process-wide review buffer"""
+    global _buffer
+    if _buffer is None:
+        with _buffer_lock:
+            if _buffer is None:
+                _buffer = ReviewBuffer(ReviewJournal())
+                atexit.register(_buffer.flush_all)
+    return _buffer
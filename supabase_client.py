@@ -1,8 +1,15 @@
 # Supabase Client for QUANTUM
 import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from supabase import create_client, Client
-from datetime import datetime, timedelta
+from datetime import datetime
 import streamlit as st
+from dedup_index import get_user_index
+from ttl_cache import TTLCache
+import metrics
 
 # Supabase credentials (anon key is public by design - secured by RLS)
 SUPABASE_URL = os.getenv("SUPABASE_URL", "https://dznzrxcvexmrqyctxogn.supabase.co")
@@ -16,6 +23,34 @@ def get_supabase() -> Client:
     return st.session_state.supabase_client
 
 
+# Per-session read-through cache for small per-user rows (profile, streak, usage)
+PROFILE_CACHE_TTL_S = 300
+STREAK_CACHE_TTL_S = 60
+USAGE_CACHE_TTL_S = 30 * 60   # Kept current by increment_daily_usage's returned total; keyed by day
+
+
+def _session_cache() -> dict:
+    if 'supabase_cache' not in st.session_state:
+        st.session_state.supabase_cache = {}
+    return st.session_state.supabase_cache
+
+
+def _cache_get(key):
+    entry = _session_cache().get(key)
+    if entry is not None and entry[0] > time.time():
+        return entry[1]
+    return None
+
+
+def _cache_put(key, value, ttl):
+    _session_cache()[key] = (time.time() + ttl, value)
+    return value
+
+
+def _cache_drop(key):
+    _session_cache().pop(key, None)
+
+
 # ========================
 # AUTH FUNCTIONS (Google OAuth)
 # ========================
@@ -53,6 +88,7 @@ def sign_out():
         # Clear client so next login gets fresh auth state
         if 'supabase_client' in st.session_state:
             del st.session_state.supabase_client
+        st.session_state.pop('supabase_cache', None)
         return {"success": True}
     except Exception as e:
         return {"success": False, "error": str(e)}
@@ -91,10 +127,22 @@ def get_current_user():
 # FLASHCARD FUNCTIONS
 # ========================
 
+CARD_INSERT_CHUNK = 500   # Rows per insert request, well under PostgREST payload limits
+CARD_INSERT_WORKERS = 4
+
+
+def _insert_card_chunk(supabase, rows):
+    return supabase.table("flashcards").insert(rows).execute().data
+
+
 def save_flashcard_set(user_id: str, name: str, cards: list):
-    """Save a set of flashcards to database. Returns DB card IDs."""
+    """Save a set of flashcards to database. Returns DB card IDs (in card order) and rows/sec.
+    Card rows go in chunks sent concurrently; if any chunk fails the set and the
+    chunks already written are deleted again, so no partial set is left behind."""
+    set_id = None
     try:
         supabase = get_supabase()
+        started = time.time()
 
         # Create set
         set_response = supabase.table("flashcard_sets").insert({
@@ -105,122 +153,274 @@ def save_flashcard_set(user_id: str, name: str, cards: list):
         set_id = set_response.data[0]["id"]
 
         # Insert cards
+        now = datetime.now().isoformat()
         cards_to_insert = [
             {
                 "set_id": set_id,
                 "question": card.get("klausimas", card.get("question", "")),
                 "answer": card.get("atsakymas", card.get("answer", "")),
                 "difficulty": 3,
-                "next_review": datetime.now().isoformat(),
+                "next_review": now,
                 "times_reviewed": 0
             }
             for card in cards
         ]
+        chunks = list(_chunks(cards_to_insert, CARD_INSERT_CHUNK))
+        if len(chunks) <= 1:
+            inserted = [_insert_card_chunk(supabase, chunk) for chunk in chunks]
+        else:
+            with ThreadPoolExecutor(max_workers=CARD_INSERT_WORKERS) as pool:
+                # map() keeps chunk order, so IDs line up with the input cards
+                inserted = list(pool.map(lambda chunk: _insert_card_chunk(supabase, chunk), chunks))
+        rows = [row for chunk_rows in inserted for row in chunk_rows]
 
-        cards_response = supabase.table("flashcards").insert(cards_to_insert).execute()
+        elapsed = time.time() - started
+        rows_per_sec = len(rows) / elapsed if elapsed > 0 else 0.0
+        metrics.record("card_insert_rows_per_sec", rows_per_sec)
 
         # Return database IDs so app can use them for study tracking
-        db_card_ids = [str(c["id"]) for c in cards_response.data]
+        db_card_ids = [str(c["id"]) for c in rows]
 
-        return {"success": True, "set_id": set_id, "card_ids": db_card_ids}
+        # Keep the near-duplicate index in step with what was inserted
+        dedup_index = get_user_index(user_id)
+        for c in rows:
+            dedup_index.add(c["id"], c["question"])
+
+        return {"success": True, "set_id": set_id, "card_ids": db_card_ids, "rows_per_sec": rows_per_sec}
     except Exception as e:
+        if set_id is not None:
+            # Compensating cleanup: drop the half-written set
+            metrics.incr("card_insert_rollbacks")
+            delete_flashcard_set(set_id)
         return {"success": False, "error": str(e), "card_ids": []}
 
 
-def load_user_flashcards(user_id: str):
-    """Load all flashcards for a user (optimized: 2 queries instead of N+1)"""
-    try:
-        supabase = get_supabase()
+FLASHCARD_COLUMNS = "id, set_id, question, answer, difficulty, next_review, times_reviewed"
+CARD_PAGE_SIZE = 500
+SET_ID_CHUNK = 50  # Set ids per in_() filter, keeps request URLs short
 
-        # Query 1: Get all user's set IDs
-        sets = supabase.table("flashcard_sets").select("id, name").eq("user_id", user_id).execute()
 
-        if not sets.data:
-            return {"success": True, "cards": []}
+def _card_from_row(card):
+    return {
+        "id": str(card["id"]),
+        "set_id": card["set_id"],
+        "klausimas": card["question"],
+        "atsakymas": card["answer"],
+        "difficulty": card.get("difficulty", 3),
+        "next_review": card.get("next_review") or datetime.now().isoformat(),
+        "times_reviewed": card.get("times_reviewed", 0)
+    }
 
-        set_ids = [s["id"] for s in sets.data]
 
-        # Query 2: Get ALL cards across all sets in one query
-        cards = supabase.table("flashcards").select("*").in_("set_id", set_ids).execute()
+def _chunks(items, size):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
 
-        all_cards = [
-            {
-                "id": str(card["id"]),
-                "set_id": card["set_id"],
-                "klausimas": card["question"],
-                "atsakymas": card["answer"],
-                "difficulty": card.get("difficulty", 3),
-                "next_review": card.get("next_review", datetime.now().isoformat()),
-                "times_reviewed": card.get("times_reviewed", 0)
-            }
-            for card in cards.data
-        ]
 
-        return {"success": True, "cards": all_cards}
+def _get_user_set_ids(supabase, user_id):
+    sets = supabase.table("flashcard_sets").select("id").eq("user_id", user_id).execute()
+    return [s["id"] for s in sets.data]
+
+
+def _iter_card_pages(supabase, set_ids, page_size=CARD_PAGE_SIZE):
+    """Yield pages of cards using keyset pagination on id (no OFFSET scans)"""
+    for chunk in _chunks(set_ids, SET_ID_CHUNK):
+        last_id = None
+        while True:
+            query = supabase.table("flashcards").select(FLASHCARD_COLUMNS).in_("set_id", chunk)
+            if last_id is not None:
+                query = query.gt("id", last_id)
+            rows = query.order("id").limit(page_size).execute().data
+            if rows:
+                yield [_card_from_row(card) for card in rows]
+            if len(rows) < page_size:
+                break
+            last_id = rows[-1]["id"]
+
+
+def _get_due_queue(supabase, user_id, limit, set_ids=None):
+    """Due count and the `limit` most overdue cards in one get_due_queue RPC (migrations/004);
+    falls back to per-chunk queries if it is not installed"""
+    try:
+        result = supabase.rpc("get_due_queue", {"p_user_id": user_id, "p_limit": limit}).execute()
+        data = result.data or {}
+        return {
+            "due_count": data.get("due_count", 0),
+            "cards": [_card_from_row(c) for c in data.get("cards") or []]
+        }
     except Exception as e:
-        return {"success": False, "error": str(e), "cards": []}
+        if not _is_missing_rpc(e):
+            raise
+
+    # Fallback: most overdue cards of each set chunk, merged here
+    if set_ids is None:
+        set_ids = _get_user_set_ids(supabase, user_id)
+    now = datetime.now().isoformat()
+    due_count = 0
+    cards = []
+    for chunk in _chunks(set_ids, SET_ID_CHUNK):
+        result = supabase.table("flashcards").select(FLASHCARD_COLUMNS, count="exact") \
+            .in_("set_id", chunk).lte("next_review", now).order("next_review").limit(limit).execute()
+        due_count += result.count or 0
+        cards.extend(_card_from_row(c) for c in result.data)
+    cards.sort(key=lambda c: c["next_review"])
+    return {"due_count": due_count, "cards": cards[:limit]}
+
+
+class BackgroundCardLoader:
+    """Fetches the rest of a user's deck on a daemon thread.
+    The script drains arrived cards on its next rerun (no st.* calls here)."""
+
+    def __init__(self, supabase, user_id, set_ids, skip_ids=()):
+        self.user_id = user_id
+        self.done = False
+        self.error = None
+        self.loaded = 0
+        self._supabase = supabase
+        self._set_ids = set_ids
+        self._skip_ids = set(skip_ids)
+        self._pending = []
+        self._lock = threading.Lock()
+        threading.Thread(target=self._run, name="card-loader", daemon=True).start()
+
+    def _run(self):
+        try:
+            for page in _iter_card_pages(self._supabase, self._set_ids):
+                with self._lock:
+                    page = [card for card in page if card["id"] not in self._skip_ids]
+                    self._pending.extend(page)
+                    self.loaded += len(page)
+        except Exception as e:
+            self.error = str(e)
+        finally:
+            self.done = True
+
+    def skip(self, card_ids):
+        """Do not deliver these cards (deleted since the load started)"""
+        with self._lock:
+            self._skip_ids.update(card_ids)
+            self._pending = [card for card in self._pending if card["id"] not in self._skip_ids]
+
+    def has_pending(self):
+        with self._lock:
+            return bool(self._pending)
+
+    def drain(self):
+        """Take the cards that arrived since the last call"""
+        with self._lock:
+            cards, self._pending = self._pending, []
+        return cards
+
+
+def load_user_flashcards_lazy(user_id: str):
+    """Load the first page of due cards (and the whole deck's due count) now and stream
+    the rest in the background. Returns {'cards', 'due_count', 'loader'}; loader is None
+    when there is nothing more to fetch."""
+    try:
+        supabase = get_supabase()
+        set_ids = _get_user_set_ids(supabase, user_id)
+        if not set_ids:
+            return {"success": True, "cards": [], "due_count": 0, "loader": None}
+
+        due = _get_due_queue(supabase, user_id, CARD_PAGE_SIZE, set_ids)
+        loader = BackgroundCardLoader(supabase, user_id, set_ids, skip_ids=[c["id"] for c in due["cards"]])
+        return {"success": True, "cards": due["cards"], "due_count": due["due_count"], "loader": loader}
+    except Exception as e:
+        return {"success": False, "error": str(e), "cards": [], "due_count": 0, "loader": None}
 
 
-def update_card_progress(card_id: str, difficulty: int):
-    """Update card's spaced repetition progress (safe: separate read/write)"""
+def get_flashcard_changes(user_id: str, since: str = None):
+    """Cards changed and ids deleted since a sync watermark (migrations/002, 007), in one request.
+    With since=None only returns a fresh watermark."""
     try:
         supabase = get_supabase()
+        result = supabase.rpc("get_flashcard_changes", {"p_user_id": user_id, "p_since": since}).execute()
+        data = result.data or {}
+        return {
+            "success": True,
+            "watermark": data.get("watermark"),
+            "cards": [_card_from_row(card) for card in data.get("cards") or []],
+            "deleted": [str(card_id) for card_id in data.get("deleted") or []],
+            "truncated": bool(data.get("truncated")),
+        }
+    except Exception as e:
+        # Fallback if RPC not defined: caller does a full reload
+        return {"success": False, "error": str(e)}
 
-        # Read current state
-        current = supabase.table("flashcards").select("times_reviewed").eq("id", card_id).execute()
 
-        if not current.data:
-            return {"success": False, "error": "Card not found"}
+REVIEW_RPC_CHUNK = 500
 
-        times_reviewed = current.data[0].get("times_reviewed", 0) + 1
 
-        # Calculate next review
-        intervals = {1: 1, 2: 1, 3: 3, 4: 7, 5: 14}
-        days = intervals.get(difficulty, 3)
-        next_review = (datetime.now() + timedelta(days=days)).isoformat()
+def _is_missing_rpc(e) -> bool:
+    """PostgREST error for a function that is not installed (migration not run yet)"""
+    err = str(e)
+    return "PGRST202" in err or "Could not find the function" in err
 
-        # Update
-        supabase.table("flashcards").update({
-            "difficulty": difficulty,
-            "next_review": next_review,
-            "times_reviewed": times_reviewed
-        }).eq("id", card_id).execute()
 
-        return {"success": True}
-    except Exception as e:
-        return {"success": False, "error": str(e)}
+def _review_payload(review):
+    """One journaled grade as an apply_card_reviews item"""
+    reviewed = datetime.fromtimestamp(review["reviewed_at"]).astimezone()
+    return {
+        "id": review["id"],
+        "card_id": review["card_id"],
+        "difficulty": review["difficulty"],
+        "reviewed_at": reviewed.isoformat(),
+        "study_date": reviewed.date().isoformat()
+    }
+
 
+def write_card_reviews(supabase, user_id: str, reviews: list):
+    """Write journaled grades (oldest first) for the review buffer. Raises on failure.
 
-def get_cards_for_review(user_id: str):
-    """Get cards that need review today"""
+    Uses the apply_card_reviews RPC (migrations/003): card progress and streak
+    change atomically on the server, one request per 500 grades, and grade ids
+    make a retried batch a no-op. Without the migration, falls back to one
+    update per card plus one streak update per study day."""
     try:
-        supabase = get_supabase()
-        today = datetime.now().isoformat()
+        for chunk in _chunks(reviews, REVIEW_RPC_CHUNK):
+            supabase.rpc("apply_card_reviews", {
+                "p_user_id": user_id,
+                "p_reviews": [_review_payload(r) for r in chunk]
+            }).execute()
+        return
+    except Exception as e:
+        if not _is_missing_rpc(e):
+            raise
+
+    # Fallback if RPC not defined: latest absolute state per card
+    latest = {}
+    studied_per_day = {}
+    for r in reviews:
+        latest[r["card_id"]] = r
+        day = datetime.fromtimestamp(r["reviewed_at"]).date()
+        studied_per_day[day] = studied_per_day.get(day, 0) + 1
+
+    # Progress columns only: card text may have been edited since the grade.
+    # Cards deleted in the meantime simply match no row.
+    for r in latest.values():
+        supabase.table("flashcards").update({
+            "difficulty": r["difficulty"],
+            "next_review": r["next_review"],
+            "times_reviewed": r["times_reviewed"]
+        }).eq("id", r["card_id"]).execute()
 
-        # Get user's set IDs
-        sets = supabase.table("flashcard_sets").select("id").eq("user_id", user_id).execute()
-        set_ids = [s["id"] for s in sets.data]
+    for day in sorted(studied_per_day):
+        _apply_streak(supabase, user_id, studied_per_day[day], day)
 
-        if not set_ids:
-            return {"success": True, "cards": []}
 
-        # Get cards due for review
-        cards = supabase.table("flashcards").select("*").in_("set_id", set_ids).lte("next_review", today).execute()
+def review_writer(user_id: str):
+    """Writer for the review buffer bound to this session's authenticated client"""
+    supabase = get_supabase()
+    return lambda reviews: write_card_reviews(supabase, user_id, reviews)
 
-        return {
-            "success": True,
-            "cards": [
-                {
-                    "id": str(c["id"]),
-                    "klausimas": c["question"],
-                    "atsakymas": c["answer"],
-                    "difficulty": c.get("difficulty", 3)
-                }
-                for c in cards.data
-            ]
-        }
+
+def get_cards_for_review(user_id: str, limit: int = 20):
+    """Get the due count and the most overdue cards (next_review order).
+    Uses the get_due_queue RPC (migrations/004); falls back to per-chunk queries if it is not installed."""
+    try:
+        return {"success": True, **_get_due_queue(get_supabase(), user_id, limit)}
     except Exception as e:
-        return {"success": False, "error": str(e), "cards": []}
+        return {"success": False, "error": str(e), "due_count": 0, "cards": []}
 
 
 def delete_flashcard_set(set_id: str):
@@ -237,18 +437,29 @@ def delete_flashcard_set(set_id: str):
 
 
 def get_user_sets(user_id: str):
-    """Get all sets for a user with card counts (for publishing UI)"""
+    """Get all sets for a user with card counts (for publishing UI) in one round trip.
+    Uses the get_user_set_summaries RPC (migrations/001) which also returns due_count
+    and last_studied_at; falls back to a PostgREST embedded count if it is not installed."""
     try:
         supabase = get_supabase()
-        sets = supabase.table("flashcard_sets").select("id, name, is_public, university, course, subject").eq("user_id", user_id).execute()
-        
+        try:
+            result = supabase.rpc("get_user_set_summaries", {"p_user_id": user_id}).execute()
+            return {"success": True, "sets": result.data or []}
+        except Exception as e:
+            if not _is_missing_rpc(e):
+                raise
+
+        # Fallback: aggregate embedding, still a single request
+        sets = supabase.table("flashcard_sets").select(
+            "id, name, is_public, university, course, subject, flashcards(count)"
+        ).eq("user_id", user_id).execute()
+
         result_sets = []
         for s in (sets.data or []):
-            # Get card count for this set
-            cards = supabase.table("flashcards").select("id", count="exact").eq("set_id", s["id"]).execute()
-            s["card_count"] = cards.count if hasattr(cards, 'count') and cards.count else len(cards.data) if cards.data else 0
+            counts = s.pop("flashcards", None) or [{}]
+            s["card_count"] = counts[0].get("count", 0)
             result_sets.append(s)
-        
+
         return {"success": True, "sets": result_sets}
     except Exception as e:
         return {"success": False, "error": str(e), "sets": []}
@@ -286,22 +497,62 @@ def make_set_public(set_id: str, university: str, course: str, subject: str, is_
             "course": course,
             "subject": subject
         }).eq("id", set_id).execute()
+        _public_sets_cache.invalidate()  # Set appears in or leaves any listing
         return {"success": True}
     except Exception as e:
         return {"success": False, "error": str(e)}
 
 
+# Listings are the same for every session: shared across sessions, keyed by (query, university)
+COMMUNITY_CACHE_TTL_S = float(os.getenv("COMMUNITY_CACHE_TTL", "60"))
+_public_sets_cache = TTLCache("community_cache", max_entries=256, ttl=COMMUNITY_CACHE_TTL_S)
+
+
 def get_public_sets(query: str = None, university: str = None):
-    """Get public sets with optional filtering"""
+    """Get public sets with optional filtering, best matches first (cached for all sessions)"""
+    if university == "Visi":
+        university = None
+    key = (" ".join((query or "").lower().split()), university or "")
+    cached = _public_sets_cache.get(key)
+    if cached is not None:
+        return {"success": True, "sets": cached}
+
+    result = _fetch_public_sets(query, university)
+    if result["success"]:
+        _public_sets_cache.put(key, result["sets"])
+    return result
+
+
+def _fetch_public_sets(query, university):
+    """Uses the search_public_sets RPC (migrations/006: indexed, diacritic-insensitive,
+    ranked by relevance and downloads, masked author label); falls back to an ilike
+    filter without the author if it is not installed."""
     try:
         supabase = get_supabase()
-        builder = supabase.table("flashcard_sets").select("*, profiles(email)").eq("is_public", True)
+        try:
+            result = supabase.rpc("search_public_sets", {
+                "p_query": query or None,
+                "p_university": university,
+                "p_limit": 50
+            }).execute()
+            sets = []
+            for s in (result.data or []):
+                s["author"] = s.pop("author_label", None) or ""
+                sets.append(s)
+            return {"success": True, "sets": sets}
+        except Exception as e:
+            if not _is_missing_rpc(e):
+                raise
+
+        # No profiles embed: what it returns depends on the caller's RLS, and listings are shared
+        builder = supabase.table("flashcard_sets").select("*").eq("is_public", True)
         
-        if university and university != "Visi":
+        if university:
             builder = builder.eq("university", university)
             
         if query:
-            # Simple text search across name, course, subject
+            # Simple text search across name, course, subject (PostgREST filter syntax chars removed)
+            query = re.sub(r'[,()*%\\]', ' ', query).strip()
             builder = builder.or_(f"name.ilike.%{query}%,course.ilike.%{query}%,subject.ilike.%{query}%")
             
         result = builder.order("downloads_count", desc=True).limit(50).execute()
@@ -310,48 +561,47 @@ def get_public_sets(query: str = None, university: str = None):
         return {"success": False, "error": str(e), "sets": []}
 
 
+def _invalidate_listings_with(set_id):
+    """Drop cached listings that show this set (its download count changed)"""
+    _public_sets_cache.invalidate(lambda sets: any(str(s.get("id")) == str(set_id) for s in sets))
+
+
 def clone_public_set(set_id: str, user_id: str):
-    """Clone a public set and its cards to a user's account"""
+    """Clone a public set and its cards to a user's account.
+    Uses the clone_flashcard_set RPC (migrations/005): the copy happens inside the
+    database and downloads_count goes up once; falls back to a client-side copy."""
     try:
         supabase = get_supabase()
-        
+        try:
+            result = supabase.rpc("clone_flashcard_set", {"p_set_id": set_id, "p_user_id": user_id}).execute()
+            _invalidate_listings_with(set_id)
+            return {"success": True, "new_set_id": result.data}
+        except Exception as e:
+            if not _is_missing_rpc(e):
+                raise
+
         # 1. Get original set details
-        orig_set = supabase.table("flashcard_sets").select("*").eq("id", set_id).single().execute()
+        orig_set = supabase.table("flashcard_sets").select("name, downloads_count").eq("id", set_id).single().execute()
         if not orig_set.data:
             return {"success": False, "error": "Rinkinys nerastas"}
-            
-        # 2. Create new set for user
-        new_set = supabase.table("flashcard_sets").insert({
-            "user_id": user_id,
-            "name": f"{orig_set.data['name']} (Kopija)",
-            "is_public": False # Clones are private by default
-        }).execute()
-        new_set_id = new_set.data[0]["id"]
-        
-        # 3. Get original cards
-        orig_cards = supabase.table("flashcards").select("*").eq("set_id", set_id).execute()
-        
-        # 4. Insert cloned cards
-        cards_to_insert = [
-            {
-                "set_id": new_set_id,
-                "question": c["question"],
-                "answer": c["answer"],
-                "difficulty": 3,
-                "next_review": datetime.now().isoformat(),
-                "times_reviewed": 0
-            }
-            for c in orig_cards.data
-        ]
-        supabase.table("flashcards").insert(cards_to_insert).execute()
-        
-        # 5. Increment download count on original
-        supabase.rpc("increment_downloads", {"set_id_param": set_id}).execute()
-        # Fallback if RPC not defined:
-        current_downloads = orig_set.data.get('downloads_count', 0)
-        supabase.table("flashcard_sets").update({"downloads_count": current_downloads + 1}).eq("id", set_id).execute()
-        
-        return {"success": True, "new_set_id": new_set_id}
+
+        # 2. Get original cards
+        orig_cards = supabase.table("flashcards").select("question, answer").eq("set_id", set_id).execute()
+
+        # 3. Create the copy (chunked insert, removed again on failure)
+        saved = save_flashcard_set(user_id, f"{orig_set.data['name']} (Kopija)", orig_cards.data)
+        if not saved.get("success"):
+            return {"success": False, "error": saved.get("error")}
+
+        # 4. Increment download count on original (exactly once)
+        try:
+            supabase.rpc("increment_downloads", {"set_id_param": set_id}).execute()
+        except Exception:
+            current_downloads = orig_set.data.get('downloads_count', 0) or 0
+            supabase.table("flashcard_sets").update({"downloads_count": current_downloads + 1}).eq("id", set_id).execute()
+
+        _invalidate_listings_with(set_id)
+        return {"success": True, "new_set_id": saved["set_id"]}
     except Exception as e:
         return {"success": False, "error": str(e)}
 # ========================
@@ -359,12 +609,15 @@ def clone_public_set(set_id: str, user_id: str):
 # ========================
 
 def get_user_profile(user_id: str):
-    """Get full user profile (premium status, subscription info)"""
+    """Get full user profile (premium status, subscription info). Cached per session."""
+    cached = _cache_get(("profile", user_id))
+    if cached is not None:
+        return cached
     try:
         supabase = get_supabase()
         result = supabase.table("profiles").select("*").eq("id", user_id).execute()
         if result.data:
-            return result.data[0]
+            return _cache_put(("profile", user_id), result.data[0], PROFILE_CACHE_TTL_S)
 
         # If no profile, create one
         supabase.table("profiles").insert({
@@ -373,7 +626,11 @@ def get_user_profile(user_id: str):
             "subscription_id": None,
             "stripe_customer_id": None
         }).execute()
-        return {"id": user_id, "is_premium": False, "subscription_id": None, "stripe_customer_id": None}
+        return _cache_put(
+            ("profile", user_id),
+            {"id": user_id, "is_premium": False, "subscription_id": None, "stripe_customer_id": None},
+            PROFILE_CACHE_TTL_S
+        )
     except Exception:
         return {"id": user_id, "is_premium": False, "subscription_id": None, "stripe_customer_id": None}
 
@@ -394,6 +651,7 @@ def set_user_premium_status(user_id: str, status: bool, subscription_id=None, st
         if stripe_customer_id is not None:
             data["stripe_customer_id"] = stripe_customer_id
         supabase.table("profiles").upsert(data).execute()
+        _cache_drop(("profile", user_id))
         return True
     except Exception:
         return False
@@ -476,59 +734,64 @@ ALTER TABLE profiles ADD COLUMN IF NOT EXISTS longest_streak INTEGER DEFAULT 0;
 ALTER TABLE profiles ADD COLUMN IF NOT EXISTS total_cards_studied INTEGER DEFAULT 0;
 """
 
+def _apply_streak(supabase, user_id: str, cards_studied: int, today):
+    """Read-modify-write of the profile streak for a study day. Returns the new values."""
+    profile = supabase.table("profiles").select(
+        "streak_count, last_study_date, longest_streak, total_cards_studied"
+    ).eq("id", user_id).single().execute()
+
+    data = profile.data or {}
+    current_streak = data.get("streak_count", 0) or 0
+    longest = data.get("longest_streak", 0) or 0
+    total = data.get("total_cards_studied", 0) or 0
+    last_study = data.get("last_study_date")
+
+    if last_study:
+        last_date = datetime.strptime(str(last_study), "%Y-%m-%d").date()
+        diff = (today - last_date).days
+
+        if diff <= 0:
+            # Already studied today — just update total
+            new_streak = current_streak
+        elif diff == 1:
+            # Consecutive day — increment streak!
+            new_streak = current_streak + 1
+        else:
+            # Missed days — reset streak
+            new_streak = 1
+    else:
+        # First time studying
+        new_streak = 1
+
+    new_longest = max(longest, new_streak)
+
+    update = {
+        "streak_count": new_streak,
+        "longest_streak": new_longest,
+        "total_cards_studied": total + cards_studied
+    }
+    if not last_study or diff >= 0:
+        update["last_study_date"] = today.isoformat()
+    supabase.table("profiles").update(update).eq("id", user_id).execute()
+
+    return {"streak": new_streak, "longest": new_longest, "total": total + cards_studied}
+
+
 def update_streak(user_id: str, cards_studied: int = 1):
     """Update user's study streak. Call after each study session."""
     try:
-        supabase = get_supabase()
-        profile = supabase.table("profiles").select(
-            "streak_count, last_study_date, longest_streak, total_cards_studied"
-        ).eq("id", user_id).single().execute()
-        
-        today = datetime.now().date()
-        data = profile.data or {}
-        current_streak = data.get("streak_count", 0) or 0
-        longest = data.get("longest_streak", 0) or 0
-        total = data.get("total_cards_studied", 0) or 0
-        last_study = data.get("last_study_date")
-        
-        if last_study:
-            last_date = datetime.strptime(str(last_study), "%Y-%m-%d").date()
-            diff = (today - last_date).days
-            
-            if diff == 0:
-                # Already studied today — just update total
-                new_streak = current_streak
-            elif diff == 1:
-                # Consecutive day — increment streak!
-                new_streak = current_streak + 1
-            else:
-                # Missed days — reset streak
-                new_streak = 1
-        else:
-            # First time studying
-            new_streak = 1
-        
-        new_longest = max(longest, new_streak)
-        
-        supabase.table("profiles").update({
-            "streak_count": new_streak,
-            "last_study_date": today.isoformat(),
-            "longest_streak": new_longest,
-            "total_cards_studied": total + cards_studied
-        }).eq("id", user_id).execute()
-        
-        return {
-            "success": True,
-            "streak": new_streak,
-            "longest": new_longest,
-            "total": total + cards_studied
-        }
+        result = _apply_streak(get_supabase(), user_id, cards_studied, datetime.now().date())
+        _cache_put(("streak", user_id), {**result, "studied_today": True}, STREAK_CACHE_TTL_S)
+        return {"success": True, **result}
     except Exception as e:
         return {"success": False, "streak": 0, "error": str(e)}
 
 
 def get_streak(user_id: str):
-    """Get user's current streak info"""
+    """Get user's current streak info. Cached per session (grades flushed in the background show up after the TTL)."""
+    cached = _cache_get(("streak", user_id))
+    if cached is not None:
+        return cached
     try:
         supabase = get_supabase()
         profile = supabase.table("profiles").select(
@@ -547,12 +810,12 @@ def get_streak(user_id: str):
             if diff > 1:
                 streak = 0  # Streak broken
 
-        return {
+        return _cache_put(("streak", user_id), {
             "streak": streak,
             "longest": data.get("longest_streak", 0) or 0,
             "total": data.get("total_cards_studied", 0) or 0,
             "studied_today": last_study == today.isoformat() if last_study else False
-        }
+        }, STREAK_CACHE_TTL_S)
     except Exception:
         return {"streak": 0, "longest": 0, "total": 0, "studied_today": False}
 
@@ -603,17 +866,19 @@ $$ LANGUAGE plpgsql SECURITY DEFINER;
 
 
 def get_daily_usage(user_id: str):
-    """Get today's generated card count from DB"""
+    """Get today's generated card count from DB. Cached per session, kept current by increment_daily_usage."""
+    today = datetime.now().date().isoformat()
+    cached = _cache_get(("usage", user_id, today))
+    if cached is not None:
+        return cached
     try:
         supabase = get_supabase()
-        today = datetime.now().date().isoformat()
         result = supabase.table("daily_usage").select("cards_generated").eq(
             "user_id", user_id
         ).eq("usage_date", today).execute()
 
-        if result.data:
-            return result.data[0]["cards_generated"]
-        return 0
+        used = result.data[0]["cards_generated"] if result.data else 0
+        return _cache_put(("usage", user_id, today), used, USAGE_CACHE_TTL_S)
     except Exception:
         return 0
 
@@ -626,7 +891,12 @@ def increment_daily_usage(user_id: str, count: int):
             "p_user_id": user_id,
             "p_count": count
         }).execute()
-        return result.data if result.data is not None else 0
+        if result.data is None:
+            _cache_drop(("usage", user_id, datetime.now().date().isoformat()))
+            return 0
+        # The RPC returns the new total: no re-read needed on the next limit check
+        return _cache_put(("usage", user_id, datetime.now().date().isoformat()), result.data, USAGE_CACHE_TTL_S)
     except Exception:
+        _cache_drop(("usage", user_id, datetime.now().date().isoformat()))
         return 0
 
@@ -0,0 +1,143 @@
+# Fuzz corpus and throughput checks for card_parser
+# Run: python -m pytest tests/
+import json
+import os
+import random
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from card_parser import IncrementalCardParser, iter_cards, parse_cards  # noqa: E402
+
+# Hand-picked shapes seen in (or close to) real model output
+CORPUS = [
+    '[{"klausimas": "Kas?", "atsakymas": "Tai."}]',
+    '```json\n[{"klausimas": "Kas?", "atsakymas": "Tai."}]\n```',
+    'Štai kortelės:\n[{"question": "Q1", "answer": "A1"}, {"front": "Q2", "back": "A2"}]\nSėkmės!',
+    '{"cards": [{"q": "Q1", "a": "A1"}, {"term": "Q2", "definition": "A2"}]}',
+    '{"data": {"cards": [{"klausimas": "Q1", "atsakymas": "A1"}]}}',
+    '[{"klausimas": "Skliaustai { ir } tekste", "atsakymas": "Kabutės \\" ir \\\\ irgi"}]',
+    '[{"klausimas": "Kablelis gale", "atsakymas": "Vis tiek tinka",}]',
+    '[{"klausimas": "Eilutė\nper dvi", "atsakymas": "Gerai"}]',
+    '[{"klausimas": "Pilna", "atsakymas": "Kortelė"}, {"klausimas": "Nukirsta", "atsa',
+    '[{"klausimas": "", "atsakymas": "Tuščias klausimas"}, {"klausimas": "Q", "atsakymas": ["sąrašas"]}]',
+    '[{"klausimas": "Q", "atsakymas": {"nested": 1}}, {"klausimas": "Q2", "atsakymas": "A2"}]',
+    'no json at all',
+    '}}}{{{',
+    '"',
+    '',
+]
+
+EXPECTED_COUNTS = [1, 1, 2, 2, 1, 1, 1, 1, 1, 0, 1, 0, 0, 0, 0]
+
+NOISE = ['{', '}', '[', ']', '"', '\\', ',', ':', '\n', ' ', 'ą', '```', 'json', '{"x": 1}']
+
+
+def _split_randomly(text, rng):
+    """Cut text into random-sized chunks, like a network stream"""
+    chunks = []
+    i = 0
+    while i < len(text):
+        n = rng.randint(1, 12)
+        chunks.append(text[i:i + n])
+        i += n
+    return chunks
+
+
+def _random_deck(rng, n):
+    cards = [
+        {"klausimas": f"Klausimas {i} {{su}} \"kabutėmis\" ir \\ ženklais?", "atsakymas": f"Atsakymas {i}\nantra eilutė"}
+        for i in range(n)
+    ]
+    wrap = rng.choice(["list", "cards", "nested", "fenced"])
+    if wrap == "cards":
+        return json.dumps({"cards": cards}, ensure_ascii=False), cards
+    if wrap == "nested":
+        return json.dumps({"data": {"cards": cards}}, ensure_ascii=False), cards
+    body = json.dumps(cards, ensure_ascii=False, indent=rng.choice([None, 2]))
+    return (f"```json\n{body}\n```" if wrap == "fenced" else body), cards
+
+
+def test_corpus_counts():
+    for text, expected in zip(CORPUS, EXPECTED_COUNTS):
+        assert len(parse_cards(text)) == expected, text
+
+
+def test_chunked_stream_matches_whole_response():
+    rng = random.Random(1234)
+    for text in CORPUS:
+        for _ in range(20):
+            assert list(iter_cards(_split_randomly(text, rng))) == parse_cards(text), text
+
+
+def test_fuzz_generated_decks_round_trip():
+    rng = random.Random(42)
+    for _ in range(200):
+        text, cards = _random_deck(rng, rng.randint(0, 15))
+        assert list(iter_cards(_split_randomly(text, rng))) == cards
+
+
+def test_fuzz_truncated_output_keeps_complete_cards():
+    rng = random.Random(7)
+    for _ in range(200):
+        text, cards = _random_deck(rng, rng.randint(1, 10))
+        cut = rng.randint(0, len(text))
+        parsed = list(iter_cards(_split_randomly(text[:cut], rng)))
+        assert parsed == cards[:len(parsed)]  # A prefix of the deck, never a garbled card
+
+
+def test_fuzz_random_noise_never_raises():
+    rng = random.Random(99)
+    for _ in range(500):
+        text = "".join(rng.choice(NOISE) for _ in range(rng.randint(0, 80)))
+        parser = IncrementalCardParser()
+        for chunk in _split_randomly(text, rng):
+            for card in parser.feed(chunk):
+                assert set(card) == {"klausimas", "atsakymas"}
+        parser.finish()
+
+
+def _cards_response(n_cards, chunk_size=40):
+    text = json.dumps(
+        {"cards": [{"klausimas": f"Klausimas {i}?", "atsakymas": "Atsakymas " * 5} for i in range(n_cards)]},
+        ensure_ascii=False
+    )
+    return text, [text[i:i + chunk_size] for i in range(0, len(text), chunk_size)]
+
+
+def _carried_per_char(n_cards):
+    """Characters re-read across feeds (what each feed carries over) per character of response"""
+    text, chunks = _cards_response(n_cards)
+    parser = IncrementalCardParser()
+    carried = count = 0
+    for chunk in chunks:
+        carried += len(parser._pending)
+        count += len(parser.feed(chunk))
+    assert count == n_cards
+    return carried / len(text)
+
+
+def test_rescanned_text_is_linear_in_response_length():
+    """Only the unfinished card is carried between feeds; keeping the {"cards": [...]} wrapper would be quadratic"""
+    for n_cards in (1000, 8000):
+        assert _carried_per_char(n_cards) < 2, n_cards
+
+
+def _throughput(n_cards):
+    text, chunks = _cards_response(n_cards)
+    started = time.perf_counter()
+    count = sum(1 for _ in iter_cards(chunks))
+    elapsed = time.perf_counter() - started
+    assert count == n_cards
+    return len(text) / elapsed
+
+
+@pytest.mark.skipif(not os.getenv("QUANTUM_BENCH"), reason="wall-clock benchmark; set QUANTUM_BENCH=1")
+def test_throughput_is_linear_in_response_length():
+    """Benchmark: bytes/s on a streamed {"cards": [...]} response must not fall as it grows"""
+    small_rate = _throughput(1000)
+    large_rate = _throughput(8000)
+    assert large_rate > small_rate / 3  # Quadratic rescanning would drop ~8x
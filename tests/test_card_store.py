@@ -0,0 +1,132 @@
+# CardStore behaviour and its memory benchmark
+# Run: python -m pytest tests/
+import gc
+import json
+import os
+import sys
+import tracemalloc
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from card_store import Card, CardStore  # noqa: E402
+
+CARDS_PER_SET = 40
+
+
+def _rows(n):
+    """Deck as loaded from Supabase (supabase_client._card_from_row shape), decoded from JSON"""
+    start = datetime(2026, 1, 1)
+    return json.loads(json.dumps([
+        {
+            "id": f"00000000-0000-4000-8000-{i:012d}",
+            "set_id": f"10000000-0000-4000-8000-{i // CARDS_PER_SET:012d}",
+            "klausimas": f"Klausimas numeris {i}: kas yra sąvoka {i}?",
+            "atsakymas": f"Atsakymas numeris {i}, paaiškintas vienu sakiniu.",
+            "difficulty": 3,
+            "next_review": (start + timedelta(minutes=i)).isoformat(),
+            "times_reviewed": i % 7,
+        }
+        for i in range(n)
+    ], ensure_ascii=False))
+
+
+def test_card_reads_like_the_old_dicts():
+    card = Card.from_dict("1", {"klausimas": "Q", "atsakymas": "A", "next_review": "2026-01-02T03:04:05"})
+    assert card["klausimas"] == card["question"] == "Q"
+    assert card.get("atsakymas") == "A"
+    assert card["next_review"] == "2026-01-02T03:04:05"
+    assert card.get("missing", "x") == "x"
+    assert "next_review" in card and "missing" not in card
+    card["next_review"] = "2026-02-01T00:00:00"
+    assert card.next_review_ts == datetime(2026, 2, 1).timestamp()
+    assert card.to_dict()["klausimas"] == "Q"
+
+
+def test_views_share_one_record():
+    store = CardStore()
+    store.replace(_rows(3))
+    card_id = store.flashcards[0].id
+    store.put(card_id, {"atsakymas": "Naujas", "difficulty": 5})
+    assert store.flashcards[0] is store.study_cards[card_id]
+    assert store.flashcards[0]["atsakymas"] == "Naujas" and store.flashcards[0].difficulty == 5
+
+
+def test_replace_append_remove_clear():
+    store = CardStore()
+    rows = _rows(5)
+    store.replace(rows[:3])
+    store.append(rows[2:])
+    assert len(store) == 5 and [c.id for c in store.flashcards] == [r["id"] for r in rows]
+    store.remove([rows[0]["id"], "unknown"])
+    assert len(store) == 4 and rows[0]["id"] not in store.study_cards
+    assert all(c.id != rows[0]["id"] for c in store.flashcards)
+    store.clear()
+    assert len(store) == 0 and store.flashcards == []
+
+
+def test_set_ids_are_shared():
+    store = CardStore()
+    store.replace(_rows(CARDS_PER_SET))
+    first, *rest = store.flashcards
+    assert all(card.set_id is first.set_id for card in rest)
+
+
+def test_version_changes_with_every_mutation():
+    store = CardStore()
+    seen = [store.version]
+    store.replace(_rows(2))
+    seen.append(store.version)
+    store.append(_rows(3)[2:])
+    seen.append(store.version)
+    store.put(store.flashcards[0].id, {"klausimas": "Kitas"})
+    seen.append(store.version)
+    store.remove([store.flashcards[0].id])
+    seen.append(store.version)
+    store.flashcards = list(store.study_cards.values())
+    seen.append(store.version)
+    store.mark_changed()
+    seen.append(store.version)
+    assert seen == sorted(set(seen))
+
+
+def _retained_bytes(build, n):
+    """Bytes still allocated after build(rows) returns what a session would keep"""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    kept = build(_rows(n))
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    assert kept is not None
+    return (after - before) / n
+
+
+def _old_layout(rows):
+    """The deck as sessions held it before CardStore: the loaded dicts plus a study dict per card"""
+    study_cards = {
+        card["id"]: {
+            "id": card["id"],
+            "question": card["klausimas"],
+            "answer": card["atsakymas"],
+            "next_review": card["next_review"],
+            "difficulty": card["difficulty"],
+            "times_reviewed": card["times_reviewed"],
+        }
+        for card in rows
+    }
+    return rows, study_cards
+
+
+def _store_layout(rows):
+    store = CardStore()
+    store.replace(rows)
+    return store
+
+
+def test_memory_per_card_benchmark():
+    """Benchmark: bytes retained per card; the store must stay well under the old two-copy layout"""
+    old = _retained_bytes(_old_layout, 5000)
+    new = _retained_bytes(_store_layout, 5000)
+    assert new < 0.7 * old, f"CardStore {new:.0f} B/card vs old layout {old:.0f} B/card"
@@ -0,0 +1,85 @@
+# Near-duplicate checks for dedup_index
+# Run: python -m pytest tests/
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dedup_index import NearDuplicateIndex, minhash, normalize_question, similarity  # noqa: E402
+
+# Questions that differ in one word but are different cards
+NEAR_MISSES = [
+    (
+        {"klausimas": "Kokie buvo pagrindiniai Pirmojo pasaulinio karo padariniai Europos ekonomikai?",
+         "atsakymas": "Infliacija, karo skolos ir reparacijos, ypač Vokietijai."},
+        {"klausimas": "Kokie buvo pagrindiniai Antrojo pasaulinio karo padariniai Europos ekonomikai?",
+         "atsakymas": "Sugriauta pramonė, Maršalo planas ir Europos padalijimas."},
+    ),
+    (
+        {"klausimas": "Kokia yra Niutono pirmojo dėsnio formuluotė (inercijos dėsnis)?",
+         "atsakymas": "Kūnas išlaiko rimties arba tolygaus tiesiaeigio judėjimo būseną, kol jo neveikia jėgos."},
+        {"klausimas": "Kokia yra Niutono antrojo dėsnio formuluotė (dinamikos dėsnis)?",
+         "atsakymas": "Kūno pagreitis proporcingas jį veikiančiai jėgai ir atvirkščiai proporcingas masei: F = ma."},
+    ),
+    (
+        {"klausimas": "Kuriais metais Lietuva paskelbė nepriklausomybę?", "atsakymas": "1918 m. vasario 16 d."},
+        {"klausimas": "Kuriais metais Lietuva atkūrė nepriklausomybę?", "atsakymas": "1990 m. kovo 11 d."},
+    ),
+]
+
+# Rewordings of the same card
+DUPLICATES = [
+    (
+        {"klausimas": "Kas yra fotosintezė?", "atsakymas": "Procesas, kai augalai šviesos energiją paverčia chemine."},
+        {"klausimas": "Kas yra fotosintezė ?", "atsakymas": "Procesas, kai augalai šviesos energiją paverčia chemine!"},
+    ),
+    (
+        {"klausimas": "Kokia yra Lietuvos sostinė?", "atsakymas": "Vilnius"},
+        {"klausimas": "KOKIA YRA LIETUVOS SOSTINĖ", "atsakymas": "vilnius"},
+    ),
+]
+
+
+def _sim(a, b):
+    return similarity(minhash(normalize_question(a)), minhash(normalize_question(b)))
+
+
+def test_near_miss_questions_are_similar_on_their_own():
+    # Guards the point of the test: the question alone would be flagged
+    first, second = NEAR_MISSES[0]
+    assert _sim(first["klausimas"], second["klausimas"]) >= 0.7
+
+
+def test_near_misses_are_kept_against_the_index():
+    for first, second in NEAR_MISSES:
+        index = NearDuplicateIndex()
+        index.add("1", first["klausimas"], first["atsakymas"])
+        new, duplicates = index.split_new([second])
+        assert new == [second] and not duplicates, second["klausimas"]
+
+
+def test_near_misses_are_kept_within_one_batch():
+    batch = [card for pair in NEAR_MISSES for card in pair]
+    new, duplicates = NearDuplicateIndex().split_new(batch)
+    assert new == batch and not duplicates
+
+
+def test_duplicates_are_dropped():
+    for first, second in DUPLICATES:
+        index = NearDuplicateIndex()
+        index.add("1", first["klausimas"], first["atsakymas"])
+        new, duplicates = index.split_new([second])
+        assert duplicates == [second] and not new, second["klausimas"]
+        new, duplicates = NearDuplicateIndex().split_new([first, second])
+        assert new == [first] and duplicates == [second]
+
+
+def test_remove_and_rebuild():
+    first, second = DUPLICATES[0]
+    index = NearDuplicateIndex()
+    index.add("1", first["klausimas"], first["atsakymas"])
+    index.remove("1")
+    assert index.split_new([second]) == ([second], [])
+    index.rebuild([dict(first, id="2")])
+    assert index.ready and len(index) == 1
+    assert index.split_new([second]) == ([], [second])
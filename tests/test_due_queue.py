@@ -0,0 +1,85 @@
+# DueQueue against a full scan of the deck
+# Run: python -m pytest tests/
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import due_queue  # noqa: E402
+from card_store import Card  # noqa: E402
+from due_queue import MASTERED_DIFFICULTY, DueQueue, review_timestamp  # noqa: E402
+
+DAY = 24 * 60 * 60
+TODAY_END = 1_800_000_000.0
+
+
+def _scan(deck, boundary):
+    """What the study tab used to compute on every rerun"""
+    due = {card_id: ts for card_id, (ts, _) in deck.items() if ts < boundary}
+    mastered = sum(1 for _, difficulty in deck.values() if difficulty >= MASTERED_DIFFICULTY)
+    peek = min(due, key=due.get) if due else None
+    return peek, len(due), mastered
+
+
+def _check(queue, deck, boundary):
+    assert (queue.peek(), queue.due_count, queue.mastered_count) == _scan(deck, boundary)
+    assert len(queue) == len(deck)
+
+
+def test_randomized_operations_match_full_scan(monkeypatch):
+    rng = random.Random(2024)
+    boundary = TODAY_END
+    monkeypatch.setattr(due_queue, "_end_of_today", lambda: boundary)
+
+    def random_ts():
+        return TODAY_END + rng.uniform(-10 * DAY, 10 * DAY)
+
+    cards = [Card(f"c{i}", "Q", "A", difficulty=rng.randint(1, 5), next_review=random_ts()) for i in range(300)]
+    deck = {card.id: (card.next_review_ts, card.difficulty) for card in cards}
+    queue = DueQueue.from_cards(cards)
+    _check(queue, deck, boundary)
+
+    next_id = len(cards)
+    for step in range(3000):
+        op = rng.random()
+        if op < 0.45 and deck:
+            # Grade: the most overdue card (what the study tab does) or any card
+            card_id = queue.peek() if rng.random() < 0.5 and queue.peek() else rng.choice(list(deck))
+            difficulty = rng.randint(1, 5)
+            ts = TODAY_END + rng.uniform(0, 10 * DAY) if difficulty > 2 else random_ts()
+            deck[card_id] = (ts, difficulty)
+            queue.update(card_id, ts, difficulty)
+        elif op < 0.7:
+            card_id = f"c{next_id}"
+            next_id += 1
+            deck[card_id] = (random_ts(), rng.randint(1, 5))
+            queue.update(card_id, *deck[card_id])
+        elif op < 0.9 and deck:
+            card_id = rng.choice(list(deck))
+            del deck[card_id]
+            queue.remove(card_id)
+        elif op < 0.92:
+            boundary += DAY  # Midnight passed
+            queue.refresh()
+        else:
+            queue.remove("not-in-queue")
+        if step % 25 == 0:
+            _check(queue, deck, boundary)
+    _check(queue, deck, boundary)
+
+
+def test_is_due_follows_updates(monkeypatch):
+    monkeypatch.setattr(due_queue, "_end_of_today", lambda: TODAY_END)
+    queue = DueQueue()
+    queue.update("a", TODAY_END - 1)
+    queue.update("b", TODAY_END + DAY)
+    assert queue.is_due("a") and not queue.is_due("b") and not queue.is_due("c")
+    queue.update("a", TODAY_END + DAY)
+    assert not queue.is_due("a") and queue.peek() is None
+
+
+def test_review_timestamp():
+    assert review_timestamp(12.5) == 12.5
+    assert review_timestamp("2026-01-01T00:00:00") == Card("x", "", "", next_review="2026-01-01T00:00:00").next_review_ts
+    assert review_timestamp("not a date") == 0.0
@@ -0,0 +1,33 @@
+# GenerationCache single-flight and what it keeps
+# Run: python -m pytest tests/
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from generation_cache import GenerationCache
+
+
+def _cache():
+    return GenerationCache(max_entries=8, disk_dir=None)
+
+
+def test_short_result_is_returned_but_not_cached():
+    cache = _cache()
+    assert cache.get_or_compute("k", lambda: ["a", "b"], expected=5) == ["a", "b"]
+    assert cache.get("k") is None
+    assert list(cache.stream_or_compute("s", lambda: iter(["a"]), expected=2)) == ["a"]
+    assert cache.get("s") is None
+    assert cache.get_or_compute("k", lambda: list("abcde"), expected=5) == list("abcde")
+    assert cache.get("k") == list("abcde")
+
+
+def test_join_rechecks_memory_after_a_leader_settled():
+    cache = _cache()
+    calls = []
+    cache.put("k", ["cached"])
+    # As if get() missed just before the leader settled: _join must still see the result
+    pending, leader, cards = cache._join("k")
+    assert (pending, leader, cards) == (None, False, ["cached"])
+    assert cache.get_or_compute("k", lambda: calls.append(1) or ["new"]) == ["cached"]
+    assert calls == [] and not cache._inflight
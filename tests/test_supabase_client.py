@@ -0,0 +1,164 @@
+# supabase_client request shapes against a recording fake client
+# Run: python -m pytest tests/
+import os
+import sys
+import uuid
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+supabase_client = pytest.importorskip("supabase_client")
+
+MISSING_RPC = Exception("{'code': 'PGRST202', 'message': 'Could not find the function'}")
+
+
+class _Result:
+    def __init__(self, data):
+        self.data = data
+        self.count = None
+
+
+class _Request:
+    """One PostgREST request being built; records its calls on execute()"""
+
+    def __init__(self, client, kind, target, params=None):
+        self._client = client
+        self.kind = kind
+        self.target = target
+        self.params = params
+        self.calls = []
+
+    def __getattr__(self, name):
+        def builder(*args, **kwargs):
+            self.calls.append((name, args, kwargs))
+            return self
+        return builder
+
+    def execute(self):
+        self._client.requests.append(self)
+        return _Result(self._client.respond(self))
+
+
+class FakeSupabase:
+    """Stands in for supabase.Client: respond(request) returns the rows or raises"""
+
+    def __init__(self, respond):
+        self.respond = respond
+        self.requests = []
+
+    def rpc(self, name, params):
+        return _Request(self, "rpc", name, params)
+
+    def table(self, name):
+        return _Request(self, "table", name)
+
+
+def _sets(n, with_counts=False):
+    sets = []
+    for i in range(n):
+        s = {"id": str(uuid.UUID(int=i)), "name": f"Rinkinys {i}", "is_public": False,
+             "university": None, "course": None, "subject": None}
+        if with_counts:
+            s["flashcards"] = [{"count": i % 30}] if i % 10 else []
+        sets.append(s)
+    return sets
+
+
+def _use(monkeypatch, respond):
+    client = FakeSupabase(respond)
+    monkeypatch.setattr(supabase_client, "get_supabase", lambda: client)
+    return client
+
+
+def test_user_sets_rpc(monkeypatch):
+    rows = [dict(s, card_count=3, due_count=1, last_studied_at=None) for s in _sets(3)]
+    client = _use(monkeypatch, lambda r: rows)
+    assert supabase_client.get_user_sets("u") == {"success": True, "sets": rows}
+    assert [(r.kind, r.target, r.params) for r in client.requests] == [
+        ("rpc", "get_user_set_summaries", {"p_user_id": "u"})
+    ]
+
+
+def test_user_sets_fallback_count_shape(monkeypatch):
+    def respond(request):
+        if request.kind == "rpc":
+            raise MISSING_RPC
+        return _sets(12, with_counts=True)
+
+    client = _use(monkeypatch, respond)
+    result = supabase_client.get_user_sets("u")
+    assert result["success"]
+    # flashcards(count) embeds as [{"count": n}]; a set without cards may come back as []
+    assert [s["card_count"] for s in result["sets"]] == [0 if i % 10 == 0 else i % 30 for i in range(12)]
+    assert all("flashcards" not in s for s in result["sets"])
+    select = next(args for name, args, _ in client.requests[1].calls if name == "select")
+    assert "flashcards(count)" in select[0]
+
+
+def test_user_sets_other_errors_are_not_hidden(monkeypatch):
+    def respond(request):
+        raise Exception("JWT expired")
+
+    client = _use(monkeypatch, respond)
+    result = supabase_client.get_user_sets("u")
+    assert not result["success"] and "JWT expired" in result["error"]
+    assert len(client.requests) == 1  # No fallback query on a real error
+
+
+@pytest.mark.parametrize("rpc_installed", [True, False])
+def test_user_sets_round_trips_do_not_grow_with_set_count(monkeypatch, rpc_installed):
+    """Benchmark: requests per listing for 10 .. 5000 sets (was one count query per set)"""
+    for n in (10, 100, 1000, 5000):
+        def respond(request, n=n):
+            if request.kind == "rpc":
+                if not rpc_installed:
+                    raise MISSING_RPC
+                return [dict(s, card_count=0, due_count=0, last_studied_at=None) for s in _sets(n)]
+            return _sets(n, with_counts=True)
+
+        client = _use(monkeypatch, respond)
+        result = supabase_client.get_user_sets("u")
+        assert len(result["sets"]) == n
+        assert len(client.requests) == (1 if rpc_installed else 2), n
+
+
+def _public_rows(n):
+    return [dict(s, is_public=True, downloads_count=n - i, created_at=None,
+                 author_label="jon***@example.com", rank=1.0) for i, s in enumerate(_sets(n))]
+
+
+def test_public_listing_uses_the_search_rpc_and_is_shared(monkeypatch):
+    supabase_client._public_sets_cache.invalidate()
+    client = _use(monkeypatch, lambda r: _public_rows(3))
+    first = supabase_client.get_public_sets("  Žmogaus   ANAT ", "Visi")
+    assert [(r.kind, r.target, r.params) for r in client.requests] == [
+        ("rpc", "search_public_sets", {"p_query": "  Žmogaus   ANAT ", "p_university": None, "p_limit": 50})
+    ]
+    assert all(s["author"] == "jon***@example.com" and "author_label" not in s for s in first["sets"])
+    # Same listing from another session: served from the shared cache
+    assert supabase_client.get_public_sets("žmogaus anat") == first
+    assert len(client.requests) == 1
+
+
+def test_default_listing_passes_no_query(monkeypatch):
+    supabase_client._public_sets_cache.invalidate()
+    client = _use(monkeypatch, lambda r: _public_rows(50))
+    assert len(supabase_client.get_public_sets()["sets"]) == 50
+    assert client.requests[0].params["p_query"] is None
+
+
+def test_public_listing_fallback_has_no_caller_dependent_author(monkeypatch):
+    supabase_client._public_sets_cache.invalidate()
+
+    def respond(request):
+        if request.kind == "rpc":
+            raise MISSING_RPC
+        return _sets(2)
+
+    client = _use(monkeypatch, respond)
+    result = supabase_client.get_public_sets("a(b),c", "VU")
+    assert result["success"] and len(result["sets"]) == 2
+    calls = {name: args for name, args, _ in client.requests[1].calls}
+    assert "profiles" not in calls["select"][0]
+    assert "(" not in calls["or_"][0].split("ilike.")[1]  # PostgREST filter characters stripped
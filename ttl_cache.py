@@ -0,0 +1,56 @@
+# Shared TTL cache for QUANTUM
+# Process-wide and thread-safe: one instance is read by every Streamlit session.
+import threading
+import time
+from collections import OrderedDict
+
+import metrics
+
+
+class TTLCache:
+    """Bounded LRU cache whose entries expire ttl seconds after they were stored"""
+
+    def __init__(self, name, max_entries=256, ttl=60.0):
+        self.name = name
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()       # key -> (expires_at, value)
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                metrics.incr(f"{self.name}_hits")
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]
+        metrics.incr(f"{self.name}_misses")
+        return default
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, predicate=None):
+        """Drop entries whose value matches predicate (all entries if None). Returns how many."""
+        with self._lock:
+            if predicate is None:
+                dropped = len(self._entries)
+                self._entries.clear()
+            else:
+                stale = [k for k, (_, value) in self._entries.items() if predicate(value)]
+                for k in stale:
+                    del self._entries[k]
+                dropped = len(stale)
+        if dropped:
+            metrics.incr(f"{self.name}_invalidations", dropped)
+        return dropped
+
+    def __len__(self):
+        return len(self._entries)